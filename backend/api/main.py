@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse
 
@@ -8,9 +9,11 @@ from typing import List, Dict
 import os
 
 from ..database.session import SessionLocal, init_db
-from ..ingestion.processor import MaterialProcessor
 from ..ingestion.chunking import Chunker
+from ..ingestion.jobs import enqueue_job
+from ..utils.uploads import receive_upload, UploadTooLarge, MAX_UPLOAD_BYTES, FORM_OVERHEAD_BYTES
 from ..rag.embedder import Embedder, RAGService
+from ..rag.index_store import init_index_registry
 from ..rag.evaluation import EvaluationService
 from ..quiz.professor_bot import ProfessorBot
 from ..quiz.planner import TopicPlanner
@@ -18,6 +21,7 @@ from ..quiz.quiz_manager import QuizManager
 from ..database.models.question import Question, QuestionStatus
 from ..database.models.hierarchy import Chapter, Section, Subsection, RawMaterial
 from ..database.models.transcript import Transcript, Quiz
+from ..database.models.job import IngestionJob
 
 
 app = FastAPI(title="Dialogue box AI System")
@@ -62,6 +66,8 @@ load_dotenv()
 @app.on_event("startup")
 def startup_event():
     init_db()
+    # Memory-map every course's FAISS shard once per worker process
+    init_index_registry()
     # Ensure default course exists for simulation
     db = SessionLocal()
     try:
@@ -116,46 +122,33 @@ def get_professor_assessments(db: Session = Depends(get_db)):
 
 # --- Professor Endpoints ---
 
-def run_material_ingestion(course_id: int, file_path: str):
-    """Background worker with its own DB session."""
-    from ..database.models.course import Course, IngestionStatus
-    db = SessionLocal()
-    try:
-        print(f"DEBUG: Starting background ingestion for {file_path}")
-        processor = MaterialProcessor(db)
-        processor.process_material(course_id, file_path, "pdf")
-        print(f"DEBUG: Background ingestion complete for {file_path}")
-    except Exception as e:
-        print(f"ERROR in background ingestion: {e}")
-        try:
-            course = db.query(Course).get(course_id)
-            if course:
-                course.ingestion_status = IngestionStatus.FAILED
-                db.commit()
-        except Exception as db_err:
-            print(f"CRITICAL: Failed to update course status to FAILED: {db_err}")
-    finally:
-        db.close()
-
 @app.post("/professor/upload/{course_id}")
 async def upload_material(
     course_id: int, 
-    background_tasks: BackgroundTasks, 
-    file: UploadFile = File(...), 
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Uploads material and triggers hierarchical ingestion."""
-    # Save file locally
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    """
+    Uploads material (multipart form, PDF in the `file` field) and queues hierarchical ingestion
+    (run by `python -m backend.ingestion.worker`).
+    """
+    # Reject oversized uploads early when the client announces the size
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    # Save file locally: the body is parsed as it streams in (limit checked per chunk), content-addressed by SHA-256
+    try:
+        file_path, sha256, size, filename = await receive_upload(request, "file", ".pdf")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Process hierarchy and chunks in background with fresh session
-    print(f"DEBUG: Triggering background ingestion for course {course_id}, file: {file.filename}")
-    background_tasks.add_task(run_material_ingestion, course_id, file_path)
+    # Processing happens in a separate worker process, not in the API
+    job = await run_in_threadpool(enqueue_job, db, course_id, file_path, "pdf", sha256)
+    print(f"DEBUG: Queued ingestion job {job.id} for course {course_id}, file: {filename} ({size} bytes, sha256 {sha256[:12]})")
     
-    return {"status": "File uploaded. Processing in background.", "filename": file.filename}
+    return {"status": "File uploaded. Queued for processing.", "filename": filename, "sha256": sha256, "job_id": job.id}
 
 
 
@@ -187,7 +180,7 @@ def trigger_generation(course_id: int, db: Session = Depends(get_db)):
     """Triggers the ProfessorBot to generate questions deterministically across the syllabus."""
     print(f"Triggering deterministic question generation for course {course_id}...")
     planner = TopicPlanner(db)
-    rag = RAGService(db, Embedder(db))
+    rag = RAGService(db, Embedder(db, read_only=True))
     bot = ProfessorBot(db, rag, planner)
     res = bot.generate_questions_for_course(course_id)
     print(f"Generation result: {res}")
@@ -204,10 +197,30 @@ def get_ingestion_status(course_id: int, db: Session = Depends(get_db)):
     return {"status": course.ingestion_status.value}
 
 
+@app.get("/professor/ingestion-jobs/{job_id}")
+def get_ingestion_job(job_id: int, db: Session = Depends(get_db)):
+    """Fetch the state, attempts and timings of one ingestion job."""
+    job = db.query(IngestionJob).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job.id,
+        "course_id": job.course_id,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "error": job.error,
+        "queued_at": job.created_at,
+        "started_at": job.started_at,
+        "heartbeat_at": job.heartbeat_at,
+        "finished_at": job.finished_at,
+    }
+
+
 # --- Lazy-Loaded Singletons for Stability ---
 class AIServices:
     def __init__(self, db: Session):
-        self.embedder = Embedder(db)
+        # Cheap per request: the embedding client and FAISS shards come from process-wide registries
+        self.embedder = Embedder(db, read_only=True)
         self.rag = RAGService(db, self.embedder)
         self.eval_svc = EvaluationService(db, self.rag)
         self.planner = TopicPlanner(db)
@@ -225,8 +238,29 @@ def clean_context_label(text: str) -> str:
     text = re.sub(r"(?i)(?:section|chapter|ch|unit)\s*\d+(\.\d+)*[:\- ]*", "", text)
     return text.strip() or "Reading"
 
+def question_payload(question: Question, answer: str, default_context: str) -> dict:
+    """Response body of a generated question (lazy-loads its section, so call it off the event loop)."""
+    return {
+        "id": question.id, 
+        "text": question.question_text, 
+        "answer": answer, 
+        "context": clean_context_label(question.subsection.section.title) if question.subsection else default_context
+    }
+
+def select_simulation_topic(db: Session, services: "AIServices", course_id: int, exclude_ids: str = None, instructions: str = None):
+    """Resolves the examiner instructions and picks the next simulation topic: (chunk, author, instructions)."""
+    # 1. Use manual instructions if provided (from UI), else fetch latest from DB
+    if not instructions:
+        quiz_config = db.query(Quiz).filter_by(course_id=course_id).order_by(Quiz.id.desc()).first()
+        instructions = quiz_config.instructions if quiz_config else None
+    
+    # 2. Live Selection
+    exclude_list = [int(i) for i in exclude_ids.split(",") if i.isdigit()] if exclude_ids else None
+    chunk, author = services.planner.select_next_topic(course_id=course_id, used_chunk_ids=exclude_list)
+    return chunk, author, instructions
+
 @app.get("/professor/simulate/next")
-def get_next_simulation_question(
+async def get_next_simulation_question(
     course_id: int, 
     exclude_ids: str = None, 
     history: str = None, 
@@ -234,18 +268,9 @@ def get_next_simulation_question(
     db: Session = Depends(get_db),
     services: AIServices = Depends(get_ai_services)
 ):
-    """Fetch a question for simulation/testing using deterministic selection and live generation."""
+    """Fetch a question for simulation/testing using deterministic selection and live generation (LLM call awaited)."""
     try:
-        # 1. Use manual instructions if provided (from UI), else fetch latest from DB
-        if instructions:
-            services.bot.instructions = instructions
-        else:
-            quiz_config = db.query(Quiz).filter_by(course_id=course_id).order_by(Quiz.id.desc()).first()
-            services.bot.instructions = quiz_config.instructions if quiz_config else None
-        
-        # 2. Live Selection
-        exclude_list = [int(i) for i in exclude_ids.split(",") if i.isdigit()] if exclude_ids else None
-        chunk, author = services.planner.select_next_topic(course_id=course_id, used_chunk_ids=exclude_list)
+        chunk, author, instructions = await run_in_threadpool(select_simulation_topic, db, services, course_id, exclude_ids, instructions)
         if not chunk:
             raise HTTPException(status_code=404, detail="No unique topics found. Review syllabus or clear history.")
 
@@ -261,16 +286,13 @@ def get_next_simulation_question(
                     history_turns.append({"role": "bot", "text": q})
                     history_turns.append({"role": "user", "text": a})
 
-        question = services.bot.generate_single_question(chunk, course_id=course_id, author=author, history_turns=history_turns)
+        question = await services.bot.generate_single_question_async(chunk, course_id=course_id, author=author, history_turns=history_turns,
+                                                                     instructions=instructions)
         
         if question:
-            return {
-                "id": question.id, 
-                "text": question.question_text, 
-                "answer": question.ideal_answer, 
-                "status": question.status.value,
-                "context": clean_context_label(question.subsection.section.title) if question.subsection else "Assessment Simulation"
-            }
+            def payload():
+                return {**question_payload(question, question.ideal_answer, "Assessment Simulation"), "status": question.status.value}
+            return await run_in_threadpool(payload)
     except HTTPException:
         # Re-raise known HTTP exceptions (like 404 No topics)
         raise
@@ -424,7 +446,7 @@ def start_quiz(quiz_id: int, data: dict, db: Session = Depends(get_db)):
     return {"quiz_id": quiz_id, "status": "authorized"}
 
 @app.post("/student/quiz/{quiz_id}/submit")
-def submit_answer(
+async def submit_answer(
     quiz_id: int, 
     data: dict, 
     db: Session = Depends(get_db),
@@ -434,7 +456,7 @@ def submit_answer(
     try:
         manager = QuizManager(db, services.eval_svc)
         
-        result = manager.submit_answer(
+        result = await manager.submit_answer_async(
             quiz_id=quiz_id,
             question_id=data.get("question_id"),
             answer_text=data.get("answer"),
@@ -448,121 +470,126 @@ def submit_answer(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="The evaluation service is temporarily busy. Please try resubmitting.")
 
-@app.get("/student/quiz/{quiz_id}/next-question")
-def get_student_next_question(
-    quiz_id: int, 
-    enrollment_id: str, 
-    student_name: str = None, 
-    exclude_ids: str = None, 
-    db: Session = Depends(get_db),
-    services: AIServices = Depends(get_ai_services)
-):
-    """Fetch the next deterministic question for the student quiz session."""
-    quiz = db.query(Quiz).get(quiz_id)
-    # 1. Detect Session State (History, Struggle, Reactions)
+SESSION_COMPLETE = {
+    "id": 999999, # Dummy ID for termination
+    "text": "thank you for the user test assessment, you may now click to Finish assessment",
+    "answer": "HIDDEN",
+    "context": "Complete",
+    "reset": True # Frontend knows to finish
+}
+
+def get_student_session_state(db: Session, quiz_id: int, enrollment_id: str) -> dict:
+    """Detects the session state of a student (history, struggle, turns spent on the current chunk)."""
     # Count how many questions this student has ALREADY answered in this quiz
     # We count transcripts as finished interactions
     answered_count = db.query(Transcript).filter_by(enrollment_id=enrollment_id, quiz_id=quiz_id).count()
-    
+    state = {
+        "answered_count": answered_count,
+        "student_struggled": False,
+        "history_turns": [],
+        "current_chunk_id": None,
+        "current_chunk_turn_count": 0,
+    }
     # 7TH TURN TERMINATION (STRICT)
     if answered_count >= 6:
-        return {
-            "id": 999999, # Dummy ID for termination
-            "text": "thank you for the user test assessment, you may now click to Finish assessment",
-            "answer": "HIDDEN",
-            "context": "Complete",
-            "reset": True # Frontend knows to finish
-        }
+        return state
 
     last_transcripts = db.query(Transcript).filter_by(enrollment_id=enrollment_id, quiz_id=quiz_id).order_by(Transcript.id.desc()).limit(10).all()
-    
-    # [PREVENT DOUBLE GENERATION]
-    # Check if a question was recently generated but not yet answered by this student.
-    from ..database.models.question import Question
-    from datetime import datetime, timedelta
-    
-    last_transcript = last_transcripts[0] if last_transcripts else None
-    student_struggled = False
-    history_turns = []
-    current_chunk_id = None
-    current_chunk_turn_count = 0
-    
     if last_transcripts:
+        last_transcript = last_transcripts[0]
         # Build history for AI awareness (Reverse to chronological)
         for t in reversed(last_transcripts):
             if t.question:
-                history_turns.append({"role": "bot", "text": t.question.question_text})
-            history_turns.append({"role": "user", "text": t.student_answer})
+                state["history_turns"].append({"role": "bot", "text": t.question.question_text})
+            state["history_turns"].append({"role": "user", "text": t.student_answer})
  
         last_answer = last_transcript.student_answer
         answer_low = (last_answer or "").lower()
         if any(k in answer_low for k in ["don't know", "dont know", "skip", "clueless", "no idea"]):
-            student_struggled = True
+            state["student_struggled"] = True
         elif last_transcript.score is not None and last_transcript.score < 0.3:
-            student_struggled = True
+            state["student_struggled"] = True
         
         # Track turns of the same chunk
         q = db.query(Question).get(last_transcript.question_id)
-        current_chunk_id = None
         if q:
-            current_chunk_id = q.chunk_id
+            state["current_chunk_id"] = q.chunk_id
             for t in last_transcripts:
                 t_q = db.query(Question).get(t.question_id)
-                if t_q and t_q.chunk_id == current_chunk_id:
-                    current_chunk_turn_count += 1
+                if t_q and t_q.chunk_id == state["current_chunk_id"]:
+                    state["current_chunk_turn_count"] += 1
                 else:
                     break
+    return state
+
+def select_student_topic(db: Session, services: "AIServices", quiz: Quiz, enrollment_id: str, state: dict):
+    """Topic selection for the next student question: (chunk, author, progression type); chunk is None when exhausted."""
+    chunk = None
+    progression_type = "FUNDAMENTAL"
+    answered_count = state["answered_count"]
+    
+    # Apply strict 3+3 filter
+    # Turn 0, 1, 2 -> Reading 1 (Scott)
+    # Turn 3, 4, 5 -> Reading 2 (Citizens)
+    filters = ["Scott", "Seeing like a State"] if answered_count < 3 else ["Citizens", "Ordinary", "Anjaria"]
+    
+    if state["current_chunk_id"] and state["current_chunk_turn_count"] < 2 and not state["student_struggled"]:
+        # Check if current chunk matches the required reading filter
+        from ..database.models.chunk import Chunk
+        chunk = db.query(Chunk).get(state["current_chunk_id"])
+        
+        # If we are supposed to switch readings (at turn 3), force a skip
+        is_switch_turn = (answered_count == 3)
+        if is_switch_turn:
+            chunk = None
+        else:
+            if state["current_chunk_turn_count"] > 0:
+                progression_type = "FOLLOW_UP"
+
+    author = None
+    if not chunk:
+        chunk, author = services.planner.select_next_topic(
+            course_id=quiz.course_id, 
+            enrollment_id=enrollment_id, 
+            quiz_id=quiz.id,
+            filter_keywords=filters
+        )
+        progression_type = "FUNDAMENTAL"
+    else:
+        author = services.planner.get_chunk_author(chunk)
+    
+    if not chunk:
+        # Fallback if specific filtered reading is not found, try any topic
+        chunk, author = services.planner.select_next_topic(course_id=quiz.course_id, enrollment_id=enrollment_id, quiz_id=quiz.id)
+    return chunk, author, progression_type
+
+@app.get("/student/quiz/{quiz_id}/next-question")
+async def get_student_next_question(
+    quiz_id: int, 
+    enrollment_id: str, 
+    student_name: str = None, 
+    exclude_ids: str = None, 
+    db: Session = Depends(get_db),
+    services: AIServices = Depends(get_ai_services)
+):
+    """
+    Fetch the next deterministic question for the student quiz session.
+    Async: DB work runs in the threadpool and the LLM call is awaited, so no thread waits on the model.
+    """
+    quiz = await run_in_threadpool(db.query(Quiz).get, quiz_id)
+    # 1. Detect Session State (History, Struggle, Reactions)
+    state = await run_in_threadpool(get_student_session_state, db, quiz_id, enrollment_id)
+    if state["answered_count"] >= 6:
+        return SESSION_COMPLETE
  
     # 2. Topic Selection Logic
     try:
-        services.bot.instructions = quiz.instructions 
-        
-        chunk = None
-        progression_type = "FUNDAMENTAL"
-        
-        # Apply strict 3+3 filter
-        # Turn 0, 1, 2 -> Reading 1 (Scott)
-        # Turn 3, 4, 5 -> Reading 2 (Citizens)
-        filters = ["Scott", "Seeing like a State"] if answered_count < 3 else ["Citizens", "Ordinary", "Anjaria"]
-        
-        if current_chunk_id and current_chunk_turn_count < 2 and not student_struggled:
-            # Check if current chunk matches the required reading filter
-            from ..database.models.chunk import Chunk
-            chunk = db.query(Chunk).get(current_chunk_id)
-            
-            # If we are supposed to switch readings (at turn 3), force a skip
-            is_switch_turn = (answered_count == 3)
-            if is_switch_turn:
-                chunk = None
-            else:
-                if current_chunk_turn_count > 0:
-                    progression_type = "FOLLOW_UP"
-
-        author = None
-        if not chunk:
-            chunk, author = services.planner.select_next_topic(
-                course_id=quiz.course_id, 
-                enrollment_id=enrollment_id, 
-                quiz_id=quiz_id,
-                filter_keywords=filters
-            )
-            progression_type = "FUNDAMENTAL"
-        else:
-            author = services.planner.get_chunk_author(chunk)
-        
+        chunk, author, progression_type = await run_in_threadpool(select_student_topic, db, services, quiz, enrollment_id, state)
         if not chunk:
-            # Fallback if specific filtered reading is not found, try any topic
-            chunk, author = services.planner.select_next_topic(course_id=quiz.course_id, enrollment_id=enrollment_id, quiz_id=quiz_id)
-            if not chunk:
-                return {
-                    "id": 999999,
-                    "text": "thank you for the user test assessment, you may now click to Finish assessment",
-                    "answer": "HIDDEN",
-                    "context": "Complete",
-                    "reset": True
-                }
+            return SESSION_COMPLETE
 
         # 3. Live Generation with Teacher-Style Awareness
+        answered_count = state["answered_count"]
         print(f"DEBUG: Requesting {progression_type} question for Chunk {chunk.id} (Turn {answered_count})")
         
         # Calculate Phase for prompt
@@ -571,25 +598,21 @@ def get_student_next_question(
         # Phase 3: Turns 4-5
         phase_num = (answered_count // 2) + 1
         
-        question = services.bot.generate_single_question(
+        question = await services.bot.generate_single_question_async(
             chunk, 
             course_id=quiz.course_id, 
             author=author, 
-            student_struggled=student_struggled, 
-            history_turns=history_turns, 
+            student_struggled=state["student_struggled"], 
+            history_turns=state["history_turns"], 
             progression_type=progression_type,
-            phase=f"PHASE {phase_num}" # New param for prompt
+            phase=f"PHASE {phase_num}", # New param for prompt
+            instructions=quiz.instructions
         )
         
         if not question:
             raise HTTPException(status_code=500, detail="Failed to generate question.")
 
-        return {
-            "id": question.id, 
-            "text": question.question_text, 
-            "answer": "HIDDEN_DURING_QUIZ", 
-            "context": clean_context_label(question.subsection.section.title) if question.subsection else "Assessment"
-        }
+        return await run_in_threadpool(question_payload, question, "HIDDEN_DURING_QUIZ", "Assessment")
     except HTTPException:
         raise
     except (Exception, StopIteration) as e:
@@ -5,3 +5,4 @@ from .hierarchy import Chapter, Section, Subsection, RawMaterial
 from .chunk import Chunk, ChunkType
 from .question import Question, QuestionStatus
 from .transcript import Quiz, Transcript
+from .job import IngestionJob, JobStatus
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Enum, Float, func, select
 import enum
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from .base import BaseModel
+from ..slice_cache import slice_cache
 
 class ChunkType(enum.Enum):
     SMALL = "S"    # Definitions, facts
@@ -11,23 +13,71 @@ class ChunkType(enum.Enum):
 class Chunk(BaseModel):
     __tablename__ = "chunks"
     
-    content = Column(Text, nullable=False)
+    # Text is either copied here (legacy / CHUNK_STORAGE=text) or referenced as a span of the raw material
+    _content = Column("content", Text)
+    raw_material_id = Column(Integer, ForeignKey("raw_materials.id", ondelete="CASCADE"), index=True)
+    start_offset = Column(Integer)
+    end_offset = Column(Integer)
     chunk_type = Column(Enum(ChunkType), nullable=False)
     vector_id = Column(String, index=True) # Reference to FAISS index
     subsection_id = Column(Integer, ForeignKey("subsections.id"))
     
     subsection = relationship("Subsection", back_populates="chunks")
+    raw_material = relationship("RawMaterial")
+
+    @hybrid_property
+    def content(self):
+        """Chunk text; span chunks are sliced from their raw material on first access (via the slice cache)."""
+        if self._content is not None or self.raw_material_id is None:
+            return self._content
+        key = self.slice_key
+        text = slice_cache.get(key)
+        if text is None:
+            text = self.raw_material.content[self.start_offset:self.end_offset]
+            slice_cache.put(key, text)
+        return text
+
+    @property
+    def slice_key(self):
+        # created_at versions the key: a span chunk is written with its raw material and never re-pointed
+        return (self.raw_material_id, self.start_offset, self.end_offset, self.created_at)
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    @content.expression
+    def content(cls):
+        from .hierarchy import RawMaterial
+        span = select(
+            func.substr(RawMaterial.content, cls.start_offset + 1, cls.end_offset - cls.start_offset)
+        ).where(RawMaterial.id == cls.raw_material_id).scalar_subquery()
+        return func.coalesce(cls._content, span)
     
     # Relationships for cascading deletes
     source_relations = relationship("KnowledgeRelation", foreign_keys="[KnowledgeRelation.source_id]", cascade="all, delete-orphan")
     target_relations = relationship("KnowledgeRelation", foreign_keys="[KnowledgeRelation.target_id]", cascade="all, delete-orphan")
 
+def load_span_texts(db, chunks):
+    """
+    Puts the text of every span chunk missing from the slice cache into it, with one query that
+    slices the raw materials in SQL: only the spans are transferred, never whole raw-material rows.
+    """
+    missing = {chunk.id: chunk for chunk in chunks
+               if chunk._content is None and chunk.raw_material_id is not None and chunk.slice_key not in slice_cache}
+    if not missing:
+        return
+    for chunk_id, text in db.execute(select(Chunk.id, Chunk.content).where(Chunk.id.in_(list(missing)))):
+        if text is not None:
+            slice_cache.put(missing[chunk_id].slice_key, text)
+
 class KnowledgeRelation(BaseModel):
     __tablename__ = "knowledge_relations"
     
     source_id = Column(Integer, ForeignKey("chunks.id", ondelete="CASCADE"), nullable=False)
     target_id = Column(Integer, ForeignKey("chunks.id", ondelete="CASCADE"), nullable=False)
     relation_type = Column(String, default="connection") # e.g. "critique", "pre-requisite"
+    weight = Column(Float) # cosine similarity for embedding (kNN) relations; NULL for keyword relations
     
     source = relationship("Chunk", foreign_keys=[source_id], overlaps="source_relations")
     target = relationship("Chunk", foreign_keys=[target_id], overlaps="target_relations")
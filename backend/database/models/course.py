@@ -16,6 +16,7 @@ class Course(BaseModel):
     description = Column(String)
     professor_id = Column(Integer, ForeignKey("users.id"))
     ingestion_status = Column(Enum(IngestionStatus), default=IngestionStatus.PENDING)
+    source_hash = Column(String(64), index=True) # sha256 of the last ingested source file
     
     professor = relationship("User", backref="courses")
     chapters = relationship("Chapter", back_populates="course", cascade="all, delete-orphan")
@@ -28,6 +28,7 @@ class Subsection(BaseModel):
     title = Column(String, nullable=False)
     order = Column(Integer)
     section_id = Column(Integer, ForeignKey("sections.id"))
+    content_hash = Column(String(64), index=True) # sha256 of the raw content (incremental re-ingestion)
     
     section = relationship("Section", back_populates="subsections")
     materials = relationship("RawMaterial", back_populates="subsection", cascade="all, delete-orphan")
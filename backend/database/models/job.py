@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, DateTime, Enum
+import enum
+from sqlalchemy.orm import relationship
+from .base import BaseModel
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+class IngestionJob(BaseModel):
+    __tablename__ = "ingestion_jobs"
+
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), index=True)
+    file_path = Column(String, nullable=False)
+    file_type = Column(String, default="pdf")
+    source_hash = Column(String(64)) # sha256 of the upload, computed while it streamed in
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, index=True)
+
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text)
+    worker_id = Column(String) # host:pid of the worker that claimed it
+
+    # Timings
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime) # refreshed by the worker while the job runs
+    finished_at = Column(DateTime)
+
+    course = relationship("Course", backref="ingestion_jobs")
@@ -18,6 +18,19 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 db_session = scoped_session(SessionLocal)
 
+
+def release_connection(db):
+    """
+    Ends the session's transaction so its pooled connection is returned before a long await (e.g. an LLM
+    call). Loaded objects are not expired, so they stay readable without a query on the event loop.
+    """
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
 def init_db():
     # Import all models here to ensure they are registered with Base
     from .models.user import User
@@ -26,6 +39,7 @@ def init_db():
     from .models.chunk import Chunk, KnowledgeRelation
     from .models.question import Question
     from .models.transcript import Quiz, Transcript
+    from .models.job import IngestionJob
     
     Base.metadata.create_all(bind=engine)
     
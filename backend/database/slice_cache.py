@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ChunkSliceCache:
+    """
+    Bounded in-process LRU of materialised span-chunk texts, capped by total characters. Keys are
+    (raw_material_id, start, end, version): ids can be reused once rows are deleted (SQLite without
+    AUTOINCREMENT), often by another process, so the version (the chunk's created_at, written with
+    its raw material) keeps a reused id from returning the old document's text.
+    """
+
+    def __init__(self, max_chars: int = None):
+        self.max_chars = max_chars or int(os.getenv("CHUNK_SLICE_CACHE_CHARS", str(8 * 1024 * 1024)))
+        self.hits = 0
+        self.misses = 0
+        self._chars = 0
+        self._entries = OrderedDict()  # key -> text, least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def __contains__(self, key: Tuple) -> bool:
+        """Membership test that leaves the hit/miss counters and LRU order alone."""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Tuple, text: str):
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._entries[key] = text
+            self._chars += len(text)
+            while self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Global instance: shared by every session in the process
+slice_cache = ChunkSliceCache()
@@ -1,13 +1,33 @@
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
+import os
+import numpy as np
 from sqlalchemy.orm import Session
 from ..database.models.chunk import Chunk, ChunkType
 from ..database.models.hierarchy import Subsection, RawMaterial
+
+Span = Tuple[int, int]  # [start, end) character offsets into the raw material text
+
 class Chunker:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, embedder=None):
         self.db = db
+        # Optional: lets re-chunking drop the stale vectors of the replaced chunks
+        self.embedder = embedder
+        # "span": chunks reference offsets into RawMaterial.content; "text": each chunk stores a copy
+        self.store_spans = os.getenv("CHUNK_STORAGE", "span").lower() != "text"
 
+        # "paragraph": blank-line paragraphs + merge heuristic; "token": sentence-packed S/M chunks
+        # sized in estimated tokens (characters / CHUNK_CHARS_PER_TOKEN), none longer than CHUNK_MAX_TOKENS
+        self.mode = os.getenv("CHUNKER_MODE", "paragraph").lower()
+        chars_per_token = float(os.getenv("CHUNK_CHARS_PER_TOKEN", "4"))
+        self.max_chars = int(int(os.getenv("CHUNK_MAX_TOKENS", "512")) * chars_per_token)
+        self.small_chars = min(int(int(os.getenv("CHUNK_S_TOKENS", "128")) * chars_per_token), self.max_chars)
+        self.medium_chars = min(int(int(os.getenv("CHUNK_M_TOKENS", "384")) * chars_per_token), self.max_chars)
+        self.overlap_chars = int(int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")) * chars_per_token)
 
-
+        # How M chunks are formed from S chunks: "heuristic" (mode default) or "embedding" (cosine similarity
+        # of adjacent S chunks >= CHUNK_MERGE_THRESHOLD, runs capped at the M size). Needs an embedder.
+        self.merge = os.getenv("CHUNK_MERGE", "heuristic").lower()
+        self.merge_threshold = float(os.getenv("CHUNK_MERGE_THRESHOLD", "0.8"))
 
     def generate_chunks(self, subsection_id: int):
         """
@@ -23,40 +43,214 @@ class Chunker:
             print(f"[ERROR] No raw material found for subsection {subsection_id}")
             return
 
-        # Step 2: Paragraph Chunking
+        # Re-chunking: replace existing chunks (and their vectors) instead of duplicating them
+        stale_chunks = self.db.query(Chunk).filter_by(subsection_id=subsection_id).all()
+        if stale_chunks:
+            print(f"[*] Replacing {len(stale_chunks)} existing chunks...")
+            if self.embedder:
+                self.embedder.remove_subsection(subsection_id)
+            for chunk in stale_chunks:
+                self.db.delete(chunk)
+            self.db.flush()
+
+        # Steps 2-4: Paragraphs -> Semantic Merge -> S, M, L
         print(f"[1/3] Splitting raw text into paragraphs...")
-        paragraphs = self._split_into_paragraphs(raw_material.content)
-        print(f"      -> SUCCESS: Found {len(paragraphs)} logical paragraphs (S chunks)")
-        
-        # Step 3: Semantic Refinement (Merging)
         print(f"[2/3] Applying Semantic Merger (AI-Logic)...")
-        refined_paragraphs = self._semantic_merge(paragraphs)
-        print(f"      -> SUCCESS: Refined into {len(refined_paragraphs)} meaningful explanations (M chunks)")
+        rows = [row for row, _ in self.chunk_rows(raw_material.content, subsection_id, raw_material.id)]
+        print(f"      -> SUCCESS: {sum(1 for r in rows if r['chunk_type'] == ChunkType.SMALL)} logical paragraphs (S chunks), "
+              f"{sum(1 for r in rows if r['chunk_type'] == ChunkType.MEDIUM)} meaningful explanations (M chunks)")
         
-        # Step 4: Multi-Granularity Derivation
         print(f"[3/3] Committing Multi-Granularity Index (S, M, L) to DB...")
-        # Small (S) = Individual (unmerged) paragraphs
-        self._create_chunks(subsection_id, paragraphs, ChunkType.SMALL)
-        
-        # Medium (M) = Refined (merged) paragraphs
-        self._create_chunks(subsection_id, refined_paragraphs, ChunkType.MEDIUM)
-        
-        # Large (L) = Concept scope (Full text)
-        self._create_l_chunk(subsection_id, raw_material.content)
+        for row in rows:
+            self.db.add(Chunk(**row))
         
         self.db.commit()
         print(f"{'='*20} CHUNKING COMPLETE {'='*24}\n")
 
+    def chunk_rows(self, text: str, subsection_id: int, raw_material_id: int) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Insert-ready Chunk rows for one raw material, each with its text (for embedding). Span rows carry
+        (raw_material_id, start_offset, end_offset) instead of a copy of the text.
+        """
+        for chunk_type, start, end in self.build_spans(text):
+            row = {"chunk_type": chunk_type, "subsection_id": subsection_id}
+            if self.store_spans:
+                row.update(raw_material_id=raw_material_id, start_offset=start, end_offset=end)
+            else:
+                row["_content"] = text[start:end]
+            yield row, text[start:end]
+
+    def build_spans(self, text: str) -> List[Tuple[ChunkType, int, int]]:
+        """
+        Pure S/M/L derivation (no DB access), shared by the ORM and bulk-insert paths.
+        Small (S) = individual paragraphs, Medium (M) = merged paragraphs, Large (L) = full text.
+        In "token" mode S and M are sentence runs packed up to CHUNK_S_TOKENS / CHUNK_M_TOKENS.
+        With embedding merge, M chunks are runs of similar adjacent S chunks instead.
+        """
+        if self.mode == "token":
+            sentences = self._split_into_sentences(text)
+            small = self._pack(sentences, self.small_chars, self.overlap_chars)
+        else:
+            small = self._split_into_paragraphs(text)
+
+        if self.uses_embedding_merge:
+            medium = self._embedding_merge(text, small)
+        elif self.mode == "token":
+            medium = self._pack(sentences, self.medium_chars, self.overlap_chars)
+        else:
+            medium = self._semantic_merge(text, small)
+        return (
+            [(ChunkType.SMALL, start, end) for start, end in small]
+            + [(ChunkType.MEDIUM, start, end) for start, end in medium]
+            + [(ChunkType.LARGE, 0, len(text))]
+        )
+
+    def build_chunks(self, text: str) -> List[Tuple[ChunkType, str]]:
+        """(chunk type, text) pairs of build_spans."""
+        return [(chunk_type, text[start:end]) for chunk_type, start, end in self.build_spans(text)]
+
+    @property
+    def uses_embedding_merge(self) -> bool:
+        return self.merge == "embedding" and self.embedder is not None
+
+    def prefetch_vectors(self, texts: List[str]):
+        """
+        Embedding merge only: embeds the S chunks of many raw materials in one batched pass up front,
+        so the per-subsection merges (and the later indexing) find their vectors already computed.
+        """
+        if not self.uses_embedding_merge:
+            return
+        small_texts = [text[start:end] for text in texts for start, end in self._small_spans(text)]
+        self.embedder.remember(small_texts)
+
+    def _small_spans(self, text: str) -> List[Span]:
+        if self.mode == "token":
+            return self._pack(self._split_into_sentences(text), self.small_chars, self.overlap_chars)
+        return self._split_into_paragraphs(text)
+
+    def _split_into_paragraphs(self, text: str) -> List[Span]:
+        """Splits text into paragraphs based on double newlines (spans exclude surrounding whitespace)."""
+        spans = []
+        position = 0
+        for part in text.split('\n\n'):
+            stripped = part.strip()
+            if stripped:
+                start = position + len(part) - len(part.lstrip())
+                spans.append((start, start + len(stripped)))
+            position += len(part) + 2
+        return spans
+
+    def _split_into_sentences(self, text: str) -> List[Span]:
+        """
+        Single left-to-right scan (no regex): a sentence ends at . ! ? (plus closing quotes/brackets)
+        followed by whitespace, or at a blank line. Spans exclude surrounding whitespace and are capped.
+        """
+        spans = []
+        n = len(text)
+        start = None
+        i = 0
+        while i < n:
+            ch = text[i]
+            if start is None:
+                if not ch.isspace():
+                    start = i
+                i += 1
+                continue
+            if ch in ".!?":
+                j = i + 1
+                while j < n and text[j] in ".!?\"')]\u201d\u2019":
+                    j += 1
+                if j >= n or text[j].isspace():
+                    spans.append((start, j))
+                    start = None
+                    i = j
+                    continue
+            elif ch == "\n":
+                j = i + 1
+                while j < n and text[j] in " \t\r":
+                    j += 1
+                if j < n and text[j] == "\n":
+                    spans.append((start, self._rstrip(text, start, i)))
+                    start = None
+                    i = j + 1
+                    continue
+            i += 1
+        if start is not None:
+            spans.append((start, self._rstrip(text, start, n)))
+        return self._cap(text, spans)
+
+    def _rstrip(self, text: str, start: int, end: int) -> int:
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return end
 
+    def _cap(self, text: str, spans: List[Span]) -> List[Span]:
+        """Hard maximum: spans longer than max_chars are cut at the last whitespace before the limit."""
+        capped = []
+        for start, end in spans:
+            while end - start > self.max_chars:
+                cut = text.rfind(" ", start + 1, start + self.max_chars)
+                if cut <= start:
+                    cut = start + self.max_chars
+                capped.append((start, self._rstrip(text, start, cut)))
+                start = cut
+                while start < end and text[start].isspace():
+                    start += 1
+            if end > start:
+                capped.append((start, end))
+        return capped
 
-    def _split_into_paragraphs(self, text: str) -> List[str]:
-        """Splits text into paragraphs based on double newlines."""
-        return [p.strip() for p in text.split('\n\n') if p.strip()]
+    def _pack(self, units: List[Span], target_chars: int, overlap_chars: int) -> List[Span]:
+        """
+        Greedily packs consecutive units (sentences) into spans of up to target_chars. Each new span
+        re-starts with the trailing units of the previous one that fit in overlap_chars. Linear in units.
+        """
+        packed = []
+        i, n = 0, len(units)
+        while i < n:
+            start, j = units[i][0], i
+            while j + 1 < n and units[j + 1][1] - start <= target_chars:
+                j += 1
+            packed.append((start, units[j][1]))
+            if j + 1 >= n:
+                break
+            # Step back over trailing units within the overlap, as long as the next unit still fits
+            k = j + 1
+            while k - 1 > i and units[j][1] - units[k - 1][0] <= overlap_chars and units[j + 1][1] - units[k - 1][0] <= target_chars:
+                k -= 1
+            i = k
+        return packed
+
+    def _embedding_merge(self, text: str, spans: List[Span]) -> List[Span]:
+        """
+        Merges runs of adjacent S chunks whose embeddings are similar: all neighbour cosine similarities
+        come from one vectorized pass, and a run is extended while the similarity to the next chunk is
+        >= merge_threshold and the merged span stays within the M size cap. Vectors come from the
+        embedder's memo (see prefetch_vectors), so they are computed once and reused for the index.
+        """
+        if len(spans) <= 1:
+            return spans
+        vectors = self.embedder.remember([text[start:end] for start, end in spans])
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0  # failed (zero) embeddings get similarity 0 and never merge
+        unit = vectors / norms[:, None]
+        similar = np.einsum("ij,ij->i", unit[:-1], unit[1:]) >= self.merge_threshold
 
-    def _semantic_merge(self, paragraphs: List[str]) -> List[str]:
+        merged = []
+        start, end = spans[0]
+        for joins, (next_start, next_end) in zip(similar.tolist(), spans[1:]):
+            if joins and next_end - start <= self.medium_chars:
+                end = next_end
+            else:
+                merged.append((start, end))
+                start, end = next_start, next_end
+        merged.append((start, end))
+        return merged
+
+    def _semantic_merge(self, text: str, paragraphs: List[Span]) -> List[Span]:
         """
         Uses an LLM or logic to merge semantically related paragraphs.
-        For now, implementing a logic-based merge skeleton.
+        For now, implementing a logic-based merge skeleton. A merged pair spans both paragraphs.
         """
         if len(paragraphs) <= 1:
             return paragraphs
@@ -69,8 +263,8 @@ class Chunker:
                 next_p = paragraphs[i+1]
                 # Placeholder for semantic check: if next_p starts with lowercase or 
                 # a conjunction, or if LLM says they should merge.
-                if self._should_merge(current, next_p):
-                    merged.append(current + " " + next_p)
+                if self._should_merge(text[current[0]:current[1]], text[next_p[0]:next_p[1]]):
+                    merged.append((current[0], next_p[1]))
                     i += 2
                     continue
             merged.append(current)
@@ -87,20 +281,3 @@ class Chunker:
         if len(p1) < 100 or (p2 and p2[0].islower()):
             return True
         return False
-
-    def _create_chunks(self, subsection_id: int, text_list: List[str], chunk_type: ChunkType):
-        for text in text_list:
-            chunk = Chunk(
-                content=text,
-                chunk_type=chunk_type,
-                subsection_id=subsection_id
-            )
-            self.db.add(chunk)
-
-    def _create_l_chunk(self, subsection_id: int, full_text: str):
-        chunk = Chunk(
-            content=full_text,
-            chunk_type=ChunkType.LARGE,
-            subsection_id=subsection_id
-        )
-        self.db.add(chunk)
@@ -0,0 +1,208 @@
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, List, Tuple
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+load_dotenv()
+
+
+def page_count(file_path: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+
+def iter_page_texts(file_path: str, start: int = 0, end: int = None, fonts: "FontScan" = None) -> Iterator[Tuple[int, str]]:
+    """Yields (page_number, text) for pages [start, end), reading each page exactly once."""
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        end = len(doc) if end is None else min(end, len(doc))
+        for page_number in range(start, end):
+            text, lines = _read_page(doc[page_number], fonts is not None)
+            if fonts is not None:
+                fonts.add_page(page_number, lines)
+            yield page_number, text
+
+
+def _read_page(page, with_fonts: bool) -> Tuple[str, list]:
+    """Page text; with `with_fonts`, also its (font size, line) pairs, built from the same "dict" parse."""
+    if not with_fonts:
+        return page.get_text(), None
+    text, lines = [], []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text.append("".join(span["text"] for span in line["spans"]) + "\n")
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if spans:
+                lines.append((round(max(span["size"] for span in spans), 1),
+                              " ".join("".join(span["text"] for span in spans).split())))
+    return "".join(text), lines
+
+
+def extract_pages(file_path: str, total_pages: int, workers: int = None, min_pages: int = None,
+                  fonts: "FontScan" = None) -> Iterator[Tuple[int, str]]:
+    """
+    Page texts in order. Large documents are split across a process pool (EXTRACTION_WORKERS,
+    default: CPU count); documents under PARALLEL_EXTRACTION_MIN_PAGES are read serially
+    because pool startup would cost more than it saves. With `fonts`, each page's font sizes are
+    fed to it as the page streams by.
+    """
+    workers = workers or int(os.getenv("EXTRACTION_WORKERS", "0")) or os.cpu_count() or 1
+    min_pages = min_pages or int(os.getenv("PARALLEL_EXTRACTION_MIN_PAGES", "200"))
+    if workers <= 1 or total_pages < min_pages:
+        return iter_page_texts(file_path, fonts=fonts)
+    print(f"    -> Parallel extraction: {total_pages} pages across {workers} worker processes")
+    return iter_page_texts_parallel(file_path, total_pages, workers, fonts)
+
+
+def iter_page_texts_parallel(file_path: str, total_pages: int, workers: int, fonts: "FontScan" = None) -> Iterator[Tuple[int, str]]:
+    """Each worker opens the PDF itself and extracts a contiguous page range; ranges are merged back in order."""
+    # Several ranges per worker keeps the pool busy when some pages are much heavier than others
+    step = max(1, -(-total_pages // (workers * 4)))
+    ranges = [(start, min(start + step, total_pages)) for start in range(0, total_pages, step)]
+    next_page = 0
+    try:
+        # "spawn" avoids forking the threads of the API / worker process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            tasks = [(file_path, start, end, fonts is not None) for start, end in ranges]
+            for (start, _), pages in zip(ranges, pool.map(_extract_page_range, tasks)):
+                for offset, (text, lines) in enumerate(pages):
+                    if fonts is not None:
+                        fonts.add_page(start + offset, lines)
+                    yield start + offset, text
+                    next_page = start + offset + 1
+    except BrokenProcessPool as e:
+        print(f"    [!] Extraction pool failed ({e}). Continuing serially from page {next_page + 1}.")
+        yield from iter_page_texts(file_path, next_page, fonts=fonts)
+
+
+def _extract_page_range(task: Tuple[str, int, int, bool]) -> List[Tuple[str, list]]:
+    import fitz  # PyMuPDF
+    file_path, start, end, with_fonts = task
+    with fitz.open(file_path) as doc:
+        return [_read_page(doc[page_number], with_fonts) for page_number in range(start, min(end, len(doc)))]
+
+
+def spool_pages(pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+    """
+    Drains the page stream into an anonymous temp file and returns an iterator reading it back, so a
+    decision that needs every page (font-size headings) costs one extraction pass without holding every
+    page in memory next to the tree built from them.
+    """
+    spool = tempfile.TemporaryFile()
+    for page_number, text in pages:
+        data = text.encode("utf-8")
+        spool.write(struct.pack("<II", page_number, len(data)))
+        spool.write(data)
+    return _read_spool(spool)
+
+
+def _read_spool(spool) -> Iterator[Tuple[int, str]]:
+    with spool:
+        spool.seek(0)
+        while True:
+            header = spool.read(8)
+            if not header:
+                return
+            page_number, size = struct.unpack("<II", header)
+            yield page_number, spool.read(size).decode("utf-8")
+
+
+def outline_headings(file_path: str) -> List[Tuple[int, str, int]]:
+    """(level, title, page_index) from the PDF's bookmarks/outline; empty when the PDF has none."""
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        toc = doc.get_toc(simple=True)
+    return [(level, " ".join(title.split()), page - 1) for level, title, page in toc if title.strip() and page >= 1]
+
+
+class FontScan:
+    """
+    Font sizes gathered page by page during extraction, for PDFs without an outline: short lines set
+    noticeably larger than the body text (HEADING_FONT_RATIO x the most common size) are headings, and
+    the largest sizes map to the top levels. Lines repeated on many pages (running heads) are ignored.
+    """
+
+    def __init__(self, max_levels: int = 3, max_heading_chars: int = 120):
+        self.max_levels = max_levels
+        self.max_heading_chars = max_heading_chars
+        self.ratio = float(os.getenv("HEADING_FONT_RATIO", "1.2"))
+        self.chars_by_size = Counter()
+        self.pages = 0
+        self._lines = []  # (line_index, page_index, size, text), only lines short enough to be headings
+        self._line_count = 0
+
+    def add_page(self, page_number: int, lines: List[Tuple[float, str]]):
+        self.pages += 1
+        for size, text in lines:
+            self.chars_by_size[size] += len(text)
+            if len(text) <= self.max_heading_chars:
+                self._lines.append((self._line_count, page_number, size, text))
+            self._line_count += 1
+
+    def headings(self) -> List[Tuple[int, str, int]]:
+        """(level, title, page_index) for every page added so far."""
+        if not self.chars_by_size:
+            return []
+        body_size = self.chars_by_size.most_common(1)[0][0]
+        candidates = [line for line in self._lines if line[2] >= body_size * self.ratio]
+        pages_per_text = Counter(text for text in {(page, text) for _, page, _, text in candidates})
+        repeated = {text for text, pages in pages_per_text.items() if pages > max(3, self.pages // 5)}
+        levels = {size: i + 1 for i, size in enumerate(sorted({size for _, _, size, _ in candidates}, reverse=True)[:self.max_levels])}
+
+        headings, previous_line = [], None
+        for i, page, size, text in candidates:
+            if size not in levels or text in repeated:
+                continue
+            # A heading wrapped over several lines arrives as consecutive lines of the same size
+            if headings and previous_line == i - 1 and headings[-1][0] == levels[size] and headings[-1][2] == page:
+                headings[-1] = (levels[size], f"{headings[-1][1]} {text}", page)
+            else:
+                headings.append((levels[size], text, page))
+            previous_line = i
+        return headings
+
+
+def with_progress(pages: Iterable[Tuple[int, str]], total_pages: int) -> Iterator[Tuple[int, str]]:
+    """Passes pages through, logging every page for small docs and every 10th page for large ones."""
+    for page_number, text in pages:
+        if total_pages < 20 or (page_number + 1) % 10 == 0 or (page_number + 1) == total_pages:
+            print(f"    [PROGRESS] Page {page_number + 1}/{total_pages} extracted. [OK]")
+        yield page_number, text
+
+
+def group_pages(pages: Iterable[Tuple[int, str]], pages_per_group: int) -> Iterator[Tuple[int, int, str]]:
+    """
+    Assembles consecutive pages into (first_page, last_page, text) blocks.
+    Only the current block is buffered and each block is joined once (no repeated `+=`).
+    """
+    buffer, first_page = [], None
+    for page_number, text in pages:
+        if first_page is None:
+            first_page = page_number
+        buffer.append(text)
+        if len(buffer) == pages_per_group:
+            yield first_page, page_number, "".join(buffer)
+            buffer, first_page = [], None
+    if buffer:
+        yield first_page, first_page + len(buffer) - 1, "".join(buffer)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (0 where unsupported)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
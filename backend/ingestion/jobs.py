@@ -0,0 +1,160 @@
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from ..database.models.job import IngestionJob, JobStatus
+from ..database.models.course import Course, IngestionStatus
+
+load_dotenv()
+
+
+def enqueue_job(db: Session, course_id: int, file_path: str, file_type: str = "pdf", source_hash: str = None) -> IngestionJob:
+    """
+    Records an ingestion job for a worker to pick up; the course shows as PENDING until then.
+    `source_hash` is the file's SHA-256 when already known, so the worker need not read the file again.
+    """
+    job = IngestionJob(
+        course_id=course_id,
+        file_path=os.path.abspath(file_path), # workers may run from a different directory
+        file_type=file_type,
+        source_hash=source_hash,
+        max_attempts=int(os.getenv("INGESTION_MAX_ATTEMPTS", "3")),
+    )
+    db.add(job)
+    course = db.query(Course).get(course_id)
+    if course:
+        course.ingestion_status = IngestionStatus.PENDING
+    db.commit()
+    return job
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(db: Session, worker_id: str = None) -> Optional[IngestionJob]:
+    """
+    Atomically moves the oldest QUEUED job to RUNNING and returns it (None when the queue is empty).
+    Postgres uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never wait on each other;
+    other backends (SQLite) fall back to a conditional UPDATE that only one worker can win.
+    """
+    worker_id = worker_id or worker_name()
+    claim = {
+        "status": JobStatus.RUNNING,
+        "worker_id": worker_id,
+        "attempts": IngestionJob.attempts + 1,
+        "started_at": datetime.utcnow(),
+        "heartbeat_at": datetime.utcnow(),
+        "finished_at": None,
+    }
+
+    if db.bind.dialect.name == "postgresql":
+        job = db.query(IngestionJob).filter(IngestionJob.status == JobStatus.QUEUED).order_by(
+            IngestionJob.id
+        ).with_for_update(skip_locked=True).first()
+        if not job:
+            db.rollback()
+            return None
+        db.execute(update(IngestionJob).where(IngestionJob.id == job.id).values(**claim))
+        db.commit()
+        db.refresh(job)
+        return job
+
+    while True:
+        job_id = db.query(IngestionJob.id).filter(IngestionJob.status == JobStatus.QUEUED).order_by(
+            IngestionJob.id
+        ).limit(1).scalar()
+        if job_id is None:
+            db.rollback()
+            return None
+        result = db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.status == JobStatus.QUEUED)
+            .values(**claim)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.query(IngestionJob).get(job_id)
+        # Another worker won this job; try the next one
+
+
+def finish_job(db: Session, job: IngestionJob, succeeded: bool, error: str = None, retry: bool = True):
+    """
+    Marks a claimed job DONE, or re-queues it until its attempts are used up. `retry=False` fails it
+    at once (the failure is deterministic, so another attempt would fail the same way).
+    """
+    job.finished_at = datetime.utcnow()
+    if succeeded:
+        job.status = JobStatus.DONE
+        job.error = None
+    else:
+        job.error = error or "Ingestion failed"
+        job.status = JobStatus.QUEUED if retry and job.attempts < job.max_attempts else JobStatus.FAILED
+        if job.status == JobStatus.QUEUED and job.course:
+            job.course.ingestion_status = IngestionStatus.PENDING
+    db.commit()
+
+
+@contextmanager
+def job_heartbeat(session_factory, job_id: int, worker_id: str, interval: float = None):
+    """
+    Refreshes the job's heartbeat_at every INGESTION_HEARTBEAT_SECONDS while the body runs, from a
+    background thread with its own session, so long ingestions are never mistaken for dead workers.
+    """
+    interval = interval or float(os.getenv("INGESTION_HEARTBEAT_SECONDS", "30"))
+    stop = threading.Event()
+
+    def beat():
+        db = session_factory()
+        try:
+            while not stop.wait(interval):
+                try:
+                    result = db.execute(
+                        update(IngestionJob)
+                        .where(IngestionJob.id == job_id, IngestionJob.status == JobStatus.RUNNING,
+                               IngestionJob.worker_id == worker_id)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.commit()
+                    if result.rowcount == 0:
+                        print(f"[!] Job {job_id} is no longer claimed by {worker_id}; heartbeat stopped")
+                        return
+                except Exception as e:
+                    db.rollback()
+                    print(f"[!] Job {job_id} heartbeat failed ({e}); retrying")
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs(db: Session, timeout_seconds: float = None) -> int:
+    """Jobs left RUNNING by a worker that died (no heartbeat within the timeout) go back to the queue."""
+    timeout_seconds = timeout_seconds or float(os.getenv("INGESTION_HEARTBEAT_TIMEOUT_SECONDS", "300"))
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    # Rows claimed before heartbeats existed only have started_at
+    last_seen = func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at)
+    stale = (IngestionJob.status == JobStatus.RUNNING, last_seen < cutoff)
+    db.execute(
+        update(IngestionJob)
+        .where(*stale, IngestionJob.attempts >= IngestionJob.max_attempts)
+        .values(status=JobStatus.FAILED, finished_at=datetime.utcnow(), error="Worker stopped responding (no attempts left)")
+    )
+    result = db.execute(
+        update(IngestionJob)
+        .where(*stale)
+        .values(status=JobStatus.QUEUED, error="Requeued: worker stopped responding")
+    )
+    db.commit()
+    return result.rowcount
@@ -5,15 +5,40 @@ from ..database.models.question import Question
 from ..database.models.chunk import Chunk, KnowledgeRelation
 from ..database.models.course import Course, IngestionStatus
 from ..rag.embedder import Embedder
+from ..rag.index_store import course_writer_lock, CourseLocked
+from ..utils.uploads import file_sha256
+import hashlib
 import os
 
+
+class IngestionError(Exception):
+    """A failure inherent to the material (e.g. no extractable text): retrying the job cannot help."""
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 class MaterialProcessor:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, bulk_insert: bool = None, incremental: bool = None):
         self.db = db
+        # Set-based persistence (INSERT ... RETURNING) instead of one flush/commit per row
+        if bulk_insert is None:
+            bulk_insert = os.getenv("INGESTION_BULK_INSERT", "1").lower() not in ("0", "false", "no")
+        self.bulk_insert = bulk_insert
+        # Re-uploads diff subsections by content hash instead of wiping the course
+        if incremental is None:
+            incremental = os.getenv("INGESTION_INCREMENTAL", "1").lower() not in ("0", "false", "no")
+        self.incremental = incremental
+        # A document already ingested (same file hash) is copied instead of re-processed
+        self.deduplicate = os.getenv("INGESTION_DEDUPLICATE", "1").lower() not in ("0", "false", "no")
 
-    def process_material(self, course_id: int, file_path: str, file_type: str):
+    def process_material(self, course_id: int, file_path: str, file_type: str, source_hash: str = None):
         """
         Main entry point for processing a study material with high-visibility audit.
+        `source_hash` is the file's SHA-256 if known (uploads are hashed as they arrive); otherwise the
+        file is hashed here, and only when deduplication needs it.
+        Returns True when the material was fully ingested. On failure the course is marked FAILED and the
+        error is raised: IngestionError when the material itself is at fault, anything else when it may pass
+        on a retry.
         """
         import time
         start_time = time.time()
@@ -21,108 +46,218 @@ class MaterialProcessor:
         print(f"### [INGESTION ENGINE] Processing: {os.path.basename(file_path)}")
         print(f"{'#'*60}")
         
-        try:
-            
-            course = self.db.query(Course).get(course_id)
-            if course:
-                course.ingestion_status = IngestionStatus.PROCESSING
-                self.db.commit()
-
-            # Step 0: Clear stale data to ensure groundedness
-            self.clear_course_data(course_id)
+        # Only one ingestion may write a course's FAISS shard at a time (across worker processes)
+        with course_writer_lock(course_id):
+            try:
             
-            # Step 1: Extraction
-            extracted_data = self._extract_structure(file_path, file_type)
-            if not extracted_data:
-                print(f"[!] INGESTION ABORTED: No data extracted.")
+                course = self.db.query(Course).get(course_id)
                 if course:
-                    course.ingestion_status = IngestionStatus.FAILED
+                    course.ingestion_status = IngestionStatus.PROCESSING
                     self.db.commit()
-                return
+
+                if not os.path.exists(file_path):
+                    raise IngestionError(f"Source file not found: {file_path}")
+
+                # Step 0: A known document is reused instead of extracted, chunked and embedded again
+                if source_hash is None and self.deduplicate:
+                    source_hash = file_sha256(file_path)
+                if self.deduplicate and self._reuse_known_document(course_id, source_hash):
+                    if course:
+                        course.ingestion_status = IngestionStatus.COMPLETED
+                        course.source_hash = source_hash
+                        self.db.commit()
+                    print(f"\n✅ [SUCCESS] Known document reused in {time.time() - start_time:.2f}s\n")
+                    return True
+
+                # Step 1: Extraction
+                extracted_data = self._extract_structure(file_path, file_type)
+                if not extracted_data:
+                    raise IngestionError(f"No text could be extracted from {os.path.basename(file_path)}")
                 
-            self._store_hierarchy(course_id, extracted_data)
+                if self.incremental and self.db.query(Chapter.id).filter_by(course_id=course_id).first():
+                    # Step 2: Re-ingestion only touches subsections whose content changed
+                    self._sync_hierarchy(course_id, extracted_data)
+                else:
+                    # Step 2: Clear stale data to ensure groundedness, then store everything
+                    self.clear_course_data(course_id)
+                    self._store_hierarchy(course_id, extracted_data)
             
-            if course:
-                course.ingestion_status = IngestionStatus.COMPLETED
-                self.db.commit()
+                if course:
+                    course.ingestion_status = IngestionStatus.COMPLETED
+                    course.source_hash = source_hash
+                    self.db.commit()
 
-            duration = time.time() - start_time
-            print(f"\n{'='*60}")
-            print(f"✅ [SUCCESS] Material Fully Chunked & Indexed in {duration:.2f}s")
-            print(f"🔗 View proof: Professor Dashboard (Knowledge Section)")
-            print(f"{'='*60}\n")
-        except Exception as e:
-            self.db.rollback() # Ensure transaction is rolled back so status update can proceed
-            course = self.db.query(Course).get(course_id)
-            if course:
-                course.ingestion_status = IngestionStatus.FAILED
-                self.db.commit()
-            print(f"\n❌ [FATAL ERROR] Ingestion Pipeline Failed: {e}")
+                duration = time.time() - start_time
+                print(f"\n{'='*60}")
+                print(f"✅ [SUCCESS] Material Fully Chunked & Indexed in {duration:.2f}s")
+                print(f"🔗 View proof: Professor Dashboard (Knowledge Section)")
+                print(f"{'='*60}\n")
+                return True
+            except Exception as e:
+                self.db.rollback() # Ensure transaction is rolled back so status update can proceed
+                course = self.db.query(Course).get(course_id)
+                if course:
+                    course.ingestion_status = IngestionStatus.FAILED
+                    course.source_hash = None
+                    self.db.commit()
+                print(f"\n❌ [FATAL ERROR] Ingestion Pipeline Failed: {e}")
+                raise
 
     def _extract_structure(self, file_path: str, file_type: str) -> List[Dict[str, Any]]:
-        """Extracts structural hierarchy from the file with per-page 'surety' logs."""
-        import fitz  # PyMuPDF
+        """
+        Extracts structural hierarchy from the file with per-page 'surety' logs.
+        Pages stream through a generator pipeline (read once -> cut at headings or grouped -> bounded blocks).
+        The chapter/section/subsection tree follows the PDF outline, or headings detected from font sizes,
+        and falls back to 5-page chapters when neither exists. No subsection exceeds EXTRACTION_MAX_BLOCK_CHARS.
+        Memory is O(document): streaming bounds the extraction stages, but the returned tree holds every
+        block's text, since storage needs it whole (the incremental sync matches against all stored blocks).
+        """
+        import time
+        from .extraction import page_count, extract_pages, with_progress, group_pages, peak_rss_mb, outline_headings, spool_pages, FontScan
+        from .structure import iter_segments, build_outline_tree, build_page_group_tree
         print(f"[*] Audit Phase 1: Deep Text Extraction")
         
         try:
-            with fitz.open(file_path) as doc:
-                total_pages = len(doc)
-                print(f"    -> Pages Detected: {total_pages}")
-                
-                full_text = ""
-                for i, page in enumerate(doc):
-                    page_text = page.get_text()
-                    full_text += page_text
-                    # Print every 10 pages for large docs to avoid terminal flooding, or every page for small ones
-                    if total_pages < 20 or (i + 1) % 10 == 0 or (i + 1) == total_pages:
-                        print(f"    [PROGRESS] Page {i+1}/{total_pages} extracted. [OK]")
-                
-                print(f"[*] Audit Phase 2: Hierarchical Syllabus Mapping")
-                
-                if not full_text:
-                    return []
+            start_time = time.time()
+            total_pages = page_count(file_path)
+            print(f"    -> Pages Detected: {total_pages}")
+
+            headings, source, fonts = [], None, None
+            if os.getenv("EXTRACTION_OUTLINE", "1").lower() not in ("0", "false", "no"):
+                headings, source = outline_headings(file_path), "PDF outline"
+                if not headings:
+                    fonts = FontScan()
+
+            pages = with_progress(extract_pages(file_path, total_pages, fonts=fonts), total_pages)
+            if fonts is not None:
+                # Font-size headings need every page: the same extraction pass collects the sizes,
+                # and page texts wait in a temp file until the headings are known
+                pages = spool_pages(pages)
+                headings, source = fonts.headings(), "font-size headings"
+            if len(headings) < 2:
+                headings = []
 
+            if headings:
+                print(f"    -> STRUCTURE: {len(headings)} headings from {source}")
+                chapters = build_outline_tree(iter_segments(pages, headings))
+            else:
                 # ACCURACY FIX: Group pages instead of arbitrary character counts
-                chapters = []
                 pages_per_chapter = 5 # Group every 5 pages into a logical chapter
+                chapters = build_page_group_tree(group_pages(pages, pages_per_chapter))
+
+            duration = time.time() - start_time
+            rate = total_pages / duration if duration > 0 else float("inf")
+            print(f"    -> Extraction: {total_pages} pages in {duration:.2f}s ({rate:.1f} pages/s), peak RSS {peak_rss_mb():.0f} MB")
+
+            print(f"[*] Audit Phase 2: Hierarchical Syllabus Mapping")
+            if not chapters:
+                return []
                 
-                for i in range(0, total_pages, pages_per_chapter):
-                    end_page = min(i + pages_per_chapter, total_pages)
-                    chapter_text = ""
-                    for p_num in range(i, end_page):
-                        chapter_text += doc[p_num].get_text()
-                    
-                    chap_num = (i // pages_per_chapter) + 1
-                    chapters.append({
-                        "title": f"Chapter {chap_num} (Pages {i+1}-{end_page})",
-                        "order": chap_num,
-                        "sections": [{
-                            "title": f"Section {chap_num}.1",
-                            "order": 1,
-                            "subsections": [{
-                                "title": f"Content Block {chap_num}.1.1",
-                                "order": 1,
-                                "content": chapter_text
-                            }]
-                        }]
-                    })
-                
-                print(f"    -> ACCURACY UPGRADE: Mapped {total_pages} pages into {len(chapters)} logical Chapters.")
-                return chapters
+            blocks = sum(len(sec["subsections"]) for c in chapters for sec in c["sections"])
+            print(f"    -> ACCURACY UPGRADE: Mapped {total_pages} pages into {len(chapters)} Chapters / {blocks} bounded blocks.")
+            return chapters
         except Exception as e:
             print(f"    [!] FAILED: PDF extraction error: {e}")
-            return []
+            raise IngestionError(f"PDF extraction error: {e}") from e
 
 
     def _store_hierarchy(self, course_id: int, hierarchy_data: List[Dict[str, Any]]):
         """Saves the detected hierarchy to the database and triggers RAG updates."""
+        if self.bulk_insert:
+            return self._store_hierarchy_bulk(course_id, hierarchy_data)
+        return self._store_hierarchy_rowwise(course_id, hierarchy_data)
+
+    def _store_hierarchy_bulk(self, course_id: int, hierarchy_data: List[Dict[str, Any]]):
+        """
+        Set-based variant of _store_hierarchy: each level of the hierarchy and all chunks go in as one
+        multi-row INSERT ... RETURNING (ids come back in parameter order, so children can be linked to their
+        parents), the whole document is embedded in one batched pass, and the shard snapshot is saved once.
+        """
+        import time
+        from sqlalchemy import update
+        from .chunking import Chunker
+        from ..database.models.chunk import ChunkType
+
+        print(f"  > Bulk-storing {len(hierarchy_data)} chapters to DB...")
+        start_time = time.time()
+
+        chapter_ids = self._insert_returning_ids(Chapter, [
+            {"title": c["title"], "order": c["order"], "course_id": course_id} for c in hierarchy_data
+        ])
+        sections = [(chapter_id, s) for chapter_id, c in zip(chapter_ids, hierarchy_data) for s in c["sections"]]
+        section_ids = self._insert_returning_ids(Section, [
+            {"title": s["title"], "order": s["order"], "chapter_id": chapter_id} for chapter_id, s in sections
+        ])
+        subsections = [(section_id, sub) for section_id, (_, s) in zip(section_ids, sections) for sub in s["subsections"]]
+        subsection_ids = self._insert_returning_ids(Subsection, [
+            {"title": sub["title"], "order": sub["order"], "section_id": section_id, "content_hash": content_hash(sub["content"])}
+            for section_id, sub in subsections
+        ])
+        raw_material_ids = self._insert_returning_ids(RawMaterial, [
+            {"content": sub["content"], "subsection_id": subsection_id}
+            for subsection_id, (_, sub) in zip(subsection_ids, subsections)
+        ])
+
+        embedder = Embedder(self.db)
+        chunker = Chunker(self.db, embedder)
+        chunker.prefetch_vectors([sub["content"] for _, sub in subsections])
+        chunks = [
+            (row, text)
+            for subsection_id, raw_material_id, (_, sub) in zip(subsection_ids, raw_material_ids, subsections)
+            for row, text in chunker.chunk_rows(sub["content"], subsection_id, raw_material_id)
+        ]
+        chunk_ids = self._insert_returning_ids(Chunk, [row for row, _ in chunks])
+        self.db.commit()
+
+        rows = len(chapter_ids) + len(section_ids) + 2 * len(subsection_ids) + len(chunk_ids)
+        duration = time.time() - start_time
+        rate = rows / duration if duration > 0 else float("inf")
+        print(f"    -> Bulk insert: {rows} rows ({len(chunk_ids)} chunks) in {duration:.2f}s ({rate:.0f} rows/s)")
+
+        # Embed every S/M chunk of the document in one batched pass (vectors computed for an embedding
+        # merge are reused), then publish the shard once
+        indexed = [(chunk_id, text) for chunk_id, (row, text) in zip(chunk_ids, chunks)
+                   if row["chunk_type"] in (ChunkType.SMALL, ChunkType.MEDIUM)]
+        if indexed:
+            print(f"    - Indexing {len(indexed)} chunks in FAISS...")
+            try:
+                vectors = embedder.embed_texts([text for _, text in indexed])
+                embedder.add(course_id, [chunk_id for chunk_id, _ in indexed], vectors)
+                self.db.execute(update(Chunk), [{"id": chunk_id, "vector_id": str(chunk_id)} for chunk_id, _ in indexed])
+                self.db.commit()
+                embedder._save_index(course_id)
+            except Exception as ee:
+                self.db.rollback()
+                print(f"      [EMBEDDING WARNING] {ee}")
+        embedder.report_throughput()
+
+        # [CREDIT OPTIMIZATION] Deterministic Knowledge Graph (keywords or kNN, no LLM calls)
+        # (earlier_only: each subsection links to the ones before it in the document)
+        self._build_relations(course_id, subsection_ids, embedder.store, earlier_only=True)
+
+    def _insert_returning_ids(self, model, rows: List[Dict[str, Any]]) -> List[int]:
+        """Multi-row INSERT ... RETURNING id; ids come back in the same order as `rows`."""
+        from sqlalchemy import insert
+        if not rows:
+            return []
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return list(self.db.scalars(statement, rows))
+
+    def _insert_rows(self, model, rows: List[Dict[str, Any]]):
+        from sqlalchemy import insert
+        if rows:
+            self.db.execute(insert(model), rows)
+
+    def _store_hierarchy_rowwise(self, course_id: int, hierarchy_data: List[Dict[str, Any]]):
+        """Row-by-row path (INGESTION_BULK_INSERT=0): one flush per row and a commit per subsection."""
         from .chunking import Chunker
         from ..rag.embedder import Embedder
         
-        chunker = Chunker(self.db)
         embedder = Embedder(self.db)
+        chunker = Chunker(self.db, embedder)
         
         print(f"  > Storing {len(hierarchy_data)} chapters to DB...")
+        stored_ids = []
 
         for chap_data in hierarchy_data:
             chapter = Chapter(title=chap_data["title"], order=chap_data["order"], course_id=course_id)
@@ -136,7 +271,8 @@ class MaterialProcessor:
 
                 for sub_data in sec_data["subsections"]:
                     try:
-                        subsection = Subsection(title=sub_data["title"], order=sub_data["order"], section_id=section.id)
+                        subsection = Subsection(title=sub_data["title"], order=sub_data["order"], section_id=section.id,
+                                                content_hash=content_hash(sub_data["content"]))
                         self.db.add(subsection)
                         self.db.flush()
 
@@ -154,23 +290,257 @@ class MaterialProcessor:
                             print(f"      [EMBEDDING WARNING] {ee}")
                         
                         self.db.commit() # Persistent save for each subsection
-
-                        # [CREDIT OPTIMIZATION] Deterministic Keyword-Based Knowledge Graph
-                        self._create_deterministic_relations(subsection.id)
+                        stored_ids.append(subsection.id)
                         
                     except Exception as sub_e:
                         print(f"    [SUBSECTION ERROR] {sub_e}")
                         self.db.rollback()
 
+        embedder.report_throughput()
+
+        # [CREDIT OPTIMIZATION] Deterministic Knowledge Graph (keywords or kNN, no LLM calls)
+        self._build_relations(course_id, stored_ids, embedder.store, earlier_only=True)
+
+
+    def _sync_hierarchy(self, course_id: int, hierarchy_data: List[Dict[str, Any]]):
+        """
+        Incremental variant of clear_course_data + _store_hierarchy. Incoming subsections are matched to the
+        stored ones by content hash (then by position): unchanged ones keep their chunks, vectors and questions,
+        and only changed or new subsections are re-chunked, re-embedded and re-related.
+        """
+        from .chunking import Chunker
+        from ..database.models.chunk import ChunkType
+
+        print(f"  > Syncing {len(hierarchy_data)} chapters against stored content (incremental)...")
+        embedder = Embedder(self.db)
+        chunker = Chunker(self.db, embedder)
+
+        stored = self.db.query(Subsection).join(Section).join(Chapter).filter(Chapter.course_id == course_id).all()
+        by_hash, by_position, stored_position = {}, {}, {}
+        for sub in stored:
+            digest = sub.content_hash or content_hash(sub.materials[0].content if sub.materials else "")
+            by_hash.setdefault(digest, []).append(sub)
+            position = stored_position[sub.id] = (sub.section.chapter.order, sub.section.order, sub.order)
+            by_position[position] = sub
+
+        incoming = [
+            ((chap["order"], sec["order"], sub["order"]), chap, sec, sub, content_hash(sub["content"]))
+            for chap in hierarchy_data for sec in chap["sections"] for sub in sec["subsections"]
+        ]
+
+        # 1. Diff: identical content first (preferring the same position), then same position with new content
+        matched, claimed = {}, set()
+        for i, (position, _, _, _, digest) in enumerate(incoming):
+            candidates = [c for c in by_hash.get(digest, []) if c.id not in claimed]
+            if candidates:
+                sub = next((c for c in candidates if by_position.get(position) is c), candidates[0])
+                matched[i] = (sub, False)
+                claimed.add(sub.id)
+        for i, (position, _, _, _, _) in enumerate(incoming):
+            sub = by_position.get(position)
+            if i not in matched and sub is not None and sub.id not in claimed:
+                matched[i] = (sub, True)
+                claimed.add(sub.id)
+
+        # 2. Apply: reuse chapters/sections by position, move or rewrite matched subsections, add new ones
+        chapters = {c.order: c for c in self.db.query(Chapter).filter_by(course_id=course_id)}
+        sections = {}
+        dirty, moved, kept = [], [], 0
+        for i, (position, chap_data, sec_data, sub_data, digest) in enumerate(incoming):
+            chapter = chapters.get(chap_data["order"])
+            if chapter is None:
+                chapter = chapters[chap_data["order"]] = Chapter(order=chap_data["order"], course_id=course_id)
+                self.db.add(chapter)
+            chapter.title = chap_data["title"]
+
+            section = sections.get(position[:2])
+            if section is None:
+                section = next((s for s in chapter.sections if s.order == sec_data["order"]), None)
+                if section is None:
+                    section = Section(order=sec_data["order"], chapter=chapter)
+                    self.db.add(section)
+                sections[position[:2]] = section
+            section.title = sec_data["title"]
+
+            sub, changed = matched.get(i, (None, True))
+            if sub is None:
+                sub = Subsection(section=section)
+                self.db.add(sub)
+                sub.materials.append(RawMaterial(content=sub_data["content"]))
+            elif changed:
+                self.db.query(Question).filter(Question.subsection_id == sub.id).delete(synchronize_session=False)
+                # Old chunks (and their vectors) go first: span chunks point into the old raw material,
+                # which is replaced by a new row rather than edited (cached spans stay valid)
+                embedder.remove(course_id, [chunk.id for chunk in sub.chunks])
+                sub.chunks.clear()
+                sub.materials.clear()
+                sub.materials.append(RawMaterial(content=sub_data["content"]))
+            else:
+                kept += 1
+                if stored_position[sub.id] != position:
+                    moved.append(sub)
+            sub.section = section
+            sub.title, sub.order, sub.content_hash = sub_data["title"], sub_data["order"], digest
+            if changed:
+                dirty.append(sub)
+
+        # 3. Stored subsections with no counterpart are removed with their vectors and questions
+        removed = [sub for sub in stored if sub.id not in claimed]
+        for sub in removed:
+            embedder.remove(course_id, [chunk.id for chunk in sub.chunks])
+            self.db.query(Question).filter(Question.subsection_id == sub.id).delete(synchronize_session=False)
+            self.db.delete(sub)
+        self.db.commit()
+
+        live_sections = {section.id for section in sections.values()}
+        for chapter in self.db.query(Chapter).filter_by(course_id=course_id).all():
+            if chapter.order not in {c["order"] for c in hierarchy_data}:
+                self.db.delete(chapter)
+                continue
+            for section in list(chapter.sections):
+                if section.id not in live_sections:
+                    self.db.delete(section)
+        self.db.commit()
+        print(f"    -> Diff: {kept} unchanged ({len(moved)} moved), {len(dirty)} changed/new, {len(removed)} removed subsections")
+
+        # 4. Re-chunk, re-embed (one batched pass, one snapshot) and re-relate only what changed
+        dirty_ids = [sub.id for sub in dirty]
+        if dirty_ids and chunker.uses_embedding_merge:
+            chunker.prefetch_vectors([content for (content,) in self.db.query(RawMaterial.content).filter(
+                RawMaterial.subsection_id.in_(dirty_ids)
+            ).all()])
+        for subsection_id in dirty_ids:
+            chunker.generate_chunks(subsection_id)
+        if dirty_ids:
+            chunks = self.db.query(Chunk).filter(
+                Chunk.subsection_id.in_(dirty_ids),
+                Chunk.chunk_type.in_([ChunkType.SMALL, ChunkType.MEDIUM])
+            ).all()
+            try:
+                if chunks:
+                    embedder.index_chunks(chunks, course_id)
+            except Exception as ee:
+                self.db.rollback()
+                print(f"      [EMBEDDING WARNING] {ee}")
+        embedder._save_index(course_id)
+        embedder.report_throughput()
+
+        # Keyword relations point from later to earlier subsections: moved ones are re-related as well
+        moved_ids = [sub.id for sub in moved]
+        if moved_ids:
+            moved_chunks = self.db.query(Chunk.id).filter(Chunk.subsection_id.in_(moved_ids)).scalar_subquery()
+            self.db.query(KnowledgeRelation).filter(
+                KnowledgeRelation.relation_type.like("shared_concept:%"),
+                KnowledgeRelation.source_id.in_(moved_chunks) | KnowledgeRelation.target_id.in_(moved_chunks)
+            ).delete(synchronize_session=False)
+            self.db.commit()
 
+        # Re-chunking dropped the relations pointing at the old chunks too: rebuild both directions
+        self._build_relations(course_id, dirty_ids + moved_ids, embedder.store, earlier_only=True, incoming=True)
+
+    def _reuse_known_document(self, course_id: int, source_hash: str) -> bool:
+        """
+        True when the document was already fully ingested: either for this course (nothing to do)
+        or for another course, whose hierarchy, chunks, vectors and relations are then cloned here.
+        """
+        # source_hash is only set by a successful ingestion (and cleared by a failed one)
+        donors = self.db.query(Course).filter(Course.source_hash == source_hash).order_by(Course.id != course_id, Course.id).all()
+        donors = [c for c in donors if c.id == course_id or c.ingestion_status == IngestionStatus.COMPLETED]
+        donors = [c for c in donors if self.db.query(Chapter.id).filter_by(course_id=c.id).first()]
+        if not donors:
+            return False
+        if donors[0].id == course_id:
+            print(f"[*] DEDUP: Document unchanged since the last ingestion of course {course_id}. Nothing to do.")
+            return True
+        for donor in donors:
+            # The donor's writer lock keeps a concurrent re-ingestion from changing its rows or shard mid-copy.
+            # A busy donor is skipped, not waited for: two courses cloning from each other would deadlock.
+            try:
+                with course_writer_lock(donor.id, wait=False):
+                    self.db.refresh(donor)
+                    if donor.source_hash != source_hash or donor.ingestion_status != IngestionStatus.COMPLETED:
+                        continue
+                    self._clone_course(donor.id, course_id)
+                    return True
+            except CourseLocked:
+                print(f"[*] DEDUP: Course {donor.id} is being re-ingested; not cloning from it.")
+        return False
+
+    def _clone_course(self, source_course_id: int, course_id: int):
+        """Copies another course's hierarchy, chunks, relations and vectors (no extraction or embedding)."""
+        import time
+        import numpy as np
+        from sqlalchemy import update
+        start_time = time.time()
+        print(f"[*] DEDUP: Document already ingested for course {source_course_id}. Cloning into course {course_id}...")
+        self.clear_course_data(course_id)
+
+        chapters = self.db.query(Chapter.id, Chapter.title, Chapter.order).filter(
+            Chapter.course_id == source_course_id).order_by(Chapter.id).all()
+        chapter_map = dict(zip([c.id for c in chapters], self._insert_returning_ids(Chapter, [
+            {"title": c.title, "order": c.order, "course_id": course_id} for c in chapters
+        ])))
+
+        sections = self.db.query(Section.id, Section.title, Section.order, Section.chapter_id).join(Chapter).filter(
+            Chapter.course_id == source_course_id).order_by(Section.id).all()
+        section_map = dict(zip([s.id for s in sections], self._insert_returning_ids(Section, [
+            {"title": s.title, "order": s.order, "chapter_id": chapter_map[s.chapter_id]} for s in sections
+        ])))
+
+        subsections = self.db.query(Subsection.id, Subsection.title, Subsection.order, Subsection.section_id, Subsection.content_hash).join(
+            Section).join(Chapter).filter(Chapter.course_id == source_course_id).order_by(Subsection.id).all()
+        subsection_map = dict(zip([s.id for s in subsections], self._insert_returning_ids(Subsection, [
+            {"title": s.title, "order": s.order, "section_id": section_map[s.section_id], "content_hash": s.content_hash}
+            for s in subsections
+        ])))
+
+        materials = self.db.query(RawMaterial.id, RawMaterial.content, RawMaterial.source_type, RawMaterial.subsection_id).join(
+            Subsection).join(Section).join(Chapter).filter(Chapter.course_id == source_course_id).order_by(RawMaterial.id).all()
+        material_map = dict(zip([m.id for m in materials], self._insert_returning_ids(RawMaterial, [
+            {"content": m.content, "source_type": m.source_type, "subsection_id": subsection_map[m.subsection_id]} for m in materials
+        ])))
+
+        # Span chunks keep their offsets and point at the copied raw material
+        chunks = self.db.query(Chunk.id, Chunk._content, Chunk.raw_material_id, Chunk.start_offset, Chunk.end_offset,
+                               Chunk.chunk_type, Chunk.subsection_id).join(
+            Subsection).join(Section).join(Chapter).filter(Chapter.course_id == source_course_id).order_by(Chunk.id).all()
+        chunk_map = dict(zip([c.id for c in chunks], self._insert_returning_ids(Chunk, [
+            {"_content": c._content, "raw_material_id": material_map.get(c.raw_material_id), "start_offset": c.start_offset,
+             "end_offset": c.end_offset, "chunk_type": c.chunk_type, "subsection_id": subsection_map[c.subsection_id]}
+            for c in chunks
+        ])))
+
+        relations = self.db.query(KnowledgeRelation.source_id, KnowledgeRelation.target_id, KnowledgeRelation.relation_type,
+                                  KnowledgeRelation.weight).join(Chunk, Chunk.id == KnowledgeRelation.source_id).join(
+            Subsection).join(Section).join(Chapter).filter(Chapter.course_id == source_course_id).all()
+        self._insert_rows(KnowledgeRelation, [
+            {"source_id": chunk_map[r.source_id], "target_id": chunk_map[r.target_id],
+             "relation_type": r.relation_type, "weight": r.weight}
+            for r in relations if r.target_id in chunk_map
+        ])
+        self.db.commit()
+
+        # Vectors are copied from the source shard under the new chunk ids
+        embedder = Embedder(self.db)
+        ids, vectors = embedder.store.export(source_course_id)
+        keep = np.array([chunk_id in chunk_map for chunk_id in ids.tolist()], dtype=bool)
+        new_ids = [chunk_map[chunk_id] for chunk_id in ids[keep].tolist()]
+        if new_ids:
+            embedder.add(course_id, new_ids, vectors[keep])
+            self.db.execute(update(Chunk), [{"id": chunk_id, "vector_id": str(chunk_id)} for chunk_id in new_ids])
+            self.db.commit()
+        embedder._save_index(course_id)
+
+        print(f"    -> Cloned {len(chapter_map)} chapters, {len(chunk_map)} chunks, {len(new_ids)} vectors "
+              f"and {len(relations)} relations in {time.time() - start_time:.2f}s")
 
     def clear_course_data(self, course_id: int):
         """Wipes all hierarchical and assessment data for a course to prevent leakage."""
         print(f"\n[*] CLEANUP: Wiping stale data for Course {course_id}...")
         
-        # 1. Reset FAISS Index
+        # 1. Reset this course's FAISS shard (other courses keep their vectors)
         embedder = Embedder(self.db)
-        embedder.reset_index()
+        embedder.reset_index(course_id)
 
         # 2. Clear DB (Hierarchical cascade deletes Sections, Subsections, RawMaterial, and Chunks)
         chapters = self.db.query(Chapter).filter_by(course_id=course_id).all()
@@ -188,56 +558,48 @@ class MaterialProcessor:
         self.db.commit()
         print("    -> Database cleared.")
 
-    def _create_deterministic_relations(self, subsection_id: int):
-        """Builds KnowledgeRelations by matching keywords between the new subsection and existing ones."""
-        from ..database.models.chunk import Chunk, KnowledgeRelation, ChunkType
-        from ..database.models.hierarchy import Subsection
-        import re
-
-        # 1. Fetch current chunks for this subsection
-        current_chunks = self.db.query(Chunk).filter_by(subsection_id=subsection_id, chunk_type=ChunkType.MEDIUM).all()
-        if not current_chunks:
+    def delete_chapter(self, chapter_id: int):
+        """Deletes one chapter and removes only its chunks' vectors from the course shard."""
+        from ..database.models.chunk import Chunk
+        chapter = self.db.query(Chapter).get(chapter_id)
+        if not chapter:
             return
 
-        # 2. Extract potential keywords (Capitalized words > 4 chars, avoiding common stopwords)
-        # This is a heuristic for concepts/names
-        ignore_words = {"this", "that", "there", "their", "chapter", "section", "about", "would", "could", "should"}
-        keywords = set()
-        for chunk in current_chunks:
-            found = re.findall(r"\b[A-Z][a-z]{4,}\b", chunk.content)
-            for word in found:
-                if word.lower() not in ignore_words:
-                    keywords.add(word)
-
-        if not keywords:
-            return
+        chunk_ids = [row[0] for row in self.db.query(Chunk.id).join(Subsection).join(Section).filter(Section.chapter_id == chapter_id).all()]
+        with course_writer_lock(chapter.course_id):
+            embedder = Embedder(self.db)
+            removed = embedder.remove(chapter.course_id, chunk_ids)
+            embedder._save_index(chapter.course_id)
 
-        # 3. Search for these keywords in OTHER subsections' chunks (within the same course)
-        # We look for chunks in subsections that belong to the same course but have a different ID
-        current_sub = self.db.query(Subsection).get(subsection_id)
-        if not current_sub:
+        self.db.query(Question).filter(
+            Question.subsection_id.in_(
+                self.db.query(Subsection.id).join(Section).filter(Section.chapter_id == chapter_id)
+            )
+        ).delete(synchronize_session=False)
+        self.db.delete(chapter)
+        self.db.commit()
+        print(f"[*] Deleted chapter {chapter_id}: {removed} vectors removed from course {chapter.course_id} shard.")
+
+    def _build_relations(self, course_id: int, subsection_ids: List[int], store, earlier_only: bool = False,
+                         incoming: bool = False):
+        """
+        Knowledge graph for newly stored subsections. RELATION_BUILDER=knn rebuilds the course's embedding
+        kNN graph from the vectors in `store`; the default ("keyword") links shared capitalized keywords
+        (`incoming`: also from the rest of the course to these subsections).
+        """
+        if os.getenv("RELATION_BUILDER", "keyword").lower() == "knn":
+            from .relations import build_knn_relations
+            created = build_knn_relations(self.db, course_id, store)
+            print(f"    -> Knowledge graph: {created} kNN relations (course rebuilt)")
             return
-            
-        other_chunks = self.db.query(Chunk).join(Subsection).join(Section).join(Chapter).filter(
-            Chapter.course_id == current_sub.section.chapter.course_id,
-            Subsection.id != subsection_id,
-            Chunk.chunk_type == ChunkType.MEDIUM
-        ).all()
-
-        for cur_chunk in current_chunks:
-            for other_chunk in other_chunks:
-                # Check for shared keywords
-                shared = [k for k in keywords if k in other_chunk.content]
-                if shared:
-                    # Create relation if not exists
-                    relation = KnowledgeRelation(
-                        source_id=cur_chunk.id,
-                        target_id=other_chunk.id,
-                        relation_type=f"shared_concept:{shared[0]}"
-                    )
-                    self.db.add(relation)
+        self._create_deterministic_relations(course_id, subsection_ids, earlier_only, incoming)
 
-        self.db.commit()
+    def _create_deterministic_relations(self, course_id: int, subsection_ids: List[int], earlier_only: bool = False,
+                                        incoming: bool = False):
+        """Builds KnowledgeRelations by matching keywords between the given subsections and the rest of the course."""
+        from .relations import build_keyword_relations
+        created = build_keyword_relations(self.db, course_id, subsection_ids, earlier_only, incoming)
+        print(f"    -> Knowledge graph: {created} keyword relations added")
 
     def _create_semantic_relations(self, subsection_id: int):
         """[DEPRECATED] AI-based relation builder - preserved for compatibility check."""
@@ -0,0 +1,179 @@
+import os
+import re
+from typing import Dict, Iterable, List, Set
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from ..database.models.chunk import Chunk, KnowledgeRelation, ChunkType
+from ..database.models.hierarchy import Chapter, Section, Subsection
+
+# Heuristic for concepts/names: capitalized words > 4 chars, avoiding common stopwords
+KEYWORD_PATTERN = re.compile(r"\b[A-Z][a-z]{4,}\b")
+IGNORE_WORDS = {"this", "that", "there", "their", "chapter", "section", "about", "would", "could", "should"}
+
+load_dotenv()
+
+
+def extract_keywords(text: str) -> Set[str]:
+    return {word for word in KEYWORD_PATTERN.findall(text) if word.lower() not in IGNORE_WORDS}
+
+
+def build_keyword_relations(db: Session, course_id: int, subsection_ids: Iterable[int], earlier_only: bool = False,
+                            incoming: bool = False) -> int:
+    """
+    Deterministic keyword graph: every M chunk of a given subsection is linked to the M chunks of other
+    subsections in the course that share one of its keywords. Keyword -> chunk postings are built once for
+    the whole course, so targets come from posting lists instead of chunk x chunk substring scans.
+    `earlier_only` limits targets to subsections earlier in the document (chapter, section, subsection order),
+    so the graph follows from the content alone, however the subsections were stored or re-synced.
+    `incoming` also links the other subsections' chunks to the given ones, exactly as if those subsections
+    were rebuilt too (needed after re-chunking, which drops the relations pointing at the old chunks).
+    Pairs that already exist are skipped and new relations are written in one bulk insert.
+    Returns the number of relations created.
+    """
+    subsection_ids = list(subsection_ids)
+    if not subsection_ids:
+        return 0
+
+    rows = db.query(
+        Chunk.id, Chunk.subsection_id, Chunk.content, Chapter.order, Section.order, Subsection.order
+    ).select_from(Chunk).join(Subsection).join(Section).join(Chapter).filter(
+        Chapter.course_id == course_id,
+        Chunk.chunk_type == ChunkType.MEDIUM
+    ).all()
+
+    postings: Dict[str, List[int]] = {}
+    chunk_subsection: Dict[int, int] = {}
+    chunks_by_subsection: Dict[int, List[int]] = {}
+    keywords_by_subsection: Dict[int, Set[str]] = {}
+    keywords_by_chunk: Dict[int, Set[str]] = {}
+    position: Dict[int, tuple] = {}  # subsection -> place in the document
+    for chunk_id, subsection_id, content, chapter_order, section_order, subsection_order in rows:
+        position[subsection_id] = (chapter_order or 0, section_order or 0, subsection_order or 0, subsection_id)
+        keywords = keywords_by_chunk[chunk_id] = extract_keywords(content)
+        for keyword in keywords:
+            postings.setdefault(keyword, []).append(chunk_id)
+        chunk_subsection[chunk_id] = subsection_id
+        chunks_by_subsection.setdefault(subsection_id, []).append(chunk_id)
+        keywords_by_subsection.setdefault(subsection_id, set()).update(keywords)
+
+    existing = set(db.query(KnowledgeRelation.source_id, KnowledgeRelation.target_id).join(
+        Chunk, Chunk.id == KnowledgeRelation.source_id
+    ).filter(Chunk.subsection_id.in_(subsection_ids)).all())
+    if incoming:
+        existing.update(db.query(KnowledgeRelation.source_id, KnowledgeRelation.target_id).join(
+            Chunk, Chunk.id == KnowledgeRelation.target_id
+        ).filter(Chunk.subsection_id.in_(subsection_ids)).all())
+
+    new_relations = []
+
+    def relate(source_id: int, target_id: int, keyword: str):
+        if (source_id, target_id) in existing:
+            return
+        existing.add((source_id, target_id))
+        new_relations.append({
+            "source_id": source_id,
+            "target_id": target_id,
+            "relation_type": f"shared_concept:{keyword}",
+        })
+
+    given = set(subsection_ids)
+    for subsection_id in subsection_ids:
+        sources = chunks_by_subsection.get(subsection_id)
+        if not sources:
+            continue
+        # target chunk -> first shared keyword (sorted, so the label is deterministic)
+        targets, related = {}, set()
+        for keyword in sorted(keywords_by_subsection[subsection_id]):
+            for target_id in postings[keyword]:
+                target_subsection = chunk_subsection[target_id]
+                if target_subsection == subsection_id:
+                    continue
+                related.add(target_subsection)
+                if earlier_only and position[target_subsection] > position[subsection_id]:
+                    continue
+                targets.setdefault(target_id, keyword)
+
+        for source_id in sources:
+            for target_id, keyword in targets.items():
+                relate(source_id, target_id, keyword)
+
+        if not incoming:
+            continue
+        # Reverse direction, from the other subsection's point of view: all of its chunks link to each chunk
+        # here sharing one of its keywords (labelled with the first shared keyword)
+        for other in related:
+            if other in given or (earlier_only and position[other] < position[subsection_id]):
+                continue
+            for target_id in sources:
+                shared = keywords_by_subsection[other] & keywords_by_chunk[target_id]
+                if shared:
+                    for source_id in chunks_by_subsection[other]:
+                        relate(source_id, target_id, min(shared))
+
+    if new_relations:
+        db.execute(insert(KnowledgeRelation), new_relations)
+    db.commit()
+    return len(new_relations)
+
+
+def build_knn_relations(db: Session, course_id: int, store, k: int = None, threshold: float = None) -> int:
+    """
+    Embedding graph: links every M chunk of the course to its top-k most similar M chunks in other
+    subsections (cosine similarity >= threshold), with the similarity stored as the relation weight.
+    Vectors come from the course shard (no re-embedding) and neighbours are found with a batched
+    FAISS self-join, so the graph holds at most k edges per chunk. The course's outgoing M-chunk
+    relations are replaced. Returns the number of relations created.
+    """
+    import faiss
+    k = k or int(os.getenv("KNN_RELATION_K", "5"))
+    threshold = threshold if threshold is not None else float(os.getenv("KNN_RELATION_THRESHOLD", "0.7"))
+    batch_size = int(os.getenv("KNN_BATCH_SIZE", "1024"))
+
+    course_chunks = db.query(Chunk.id, Chunk.subsection_id).join(Subsection).join(Section).join(Chapter).filter(
+        Chapter.course_id == course_id,
+        Chunk.chunk_type == ChunkType.MEDIUM
+    )
+    chunk_subsection = dict(course_chunks.all())
+
+    ids, vectors = store.export(course_id)
+    keep = np.isin(ids, np.fromiter(chunk_subsection, dtype="int64", count=len(chunk_subsection)))
+    ids, vectors = ids[keep], np.ascontiguousarray(vectors[keep], dtype="float32")
+    # Zero vectors (failed embeddings) have no meaningful neighbours
+    norms = np.linalg.norm(vectors, axis=1)
+    ids, vectors = ids[norms > 0], vectors[norms > 0] / norms[norms > 0, None]
+
+    db.query(KnowledgeRelation).filter(
+        KnowledgeRelation.source_id.in_(course_chunks.with_entities(Chunk.id).scalar_subquery())
+    ).delete(synchronize_session=False)
+
+    new_relations = []
+    if len(ids) > 1:
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        # Over-fetch: self and same-subsection hits are dropped before keeping the top k
+        fetch = min(len(ids), 3 * k + 1)
+        for start in range(0, len(ids), batch_size):
+            similarities, neighbours = index.search(vectors[start:start + batch_size], fetch)
+            for row, source_id in enumerate(ids[start:start + batch_size].tolist()):
+                source_subsection = chunk_subsection[source_id]
+                kept = 0
+                for similarity, position in zip(similarities[row].tolist(), neighbours[row].tolist()):
+                    if position < 0 or similarity < threshold or kept == k:
+                        break
+                    target_id = int(ids[position])
+                    if chunk_subsection[target_id] == source_subsection:
+                        continue
+                    new_relations.append({
+                        "source_id": source_id,
+                        "target_id": target_id,
+                        "relation_type": "semantic_neighbor",
+                        "weight": similarity,
+                    })
+                    kept += 1
+
+    if new_relations:
+        db.execute(insert(KnowledgeRelation), new_relations)
+    db.commit()
+    return len(new_relations)
@@ -0,0 +1,145 @@
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_DEPTH = 3  # chapter -> section -> subsection
+
+
+def max_block_chars() -> int:
+    """Upper bound on one subsection's text (and so on its L chunk and the prompts built from it)."""
+    return int(os.getenv("EXTRACTION_MAX_BLOCK_CHARS", "6000"))
+
+
+def split_block(text: str, max_chars: int) -> List[str]:
+    """
+    Splits text into pieces of at most max_chars, cutting at paragraph breaks, then line breaks,
+    and only as a last resort mid-line. Whitespace-only text yields no pieces.
+    """
+    if not text.strip():
+        return []
+    if len(text) <= max_chars:
+        return [text.strip()]
+
+    units = []
+    for paragraph in text.split("\n\n"):
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        lines = []
+        for line in paragraph.split("\n"):
+            lines.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+        units.extend(_pack(lines, "\n", max_chars))
+    return [piece.strip() for piece in _pack(units, "\n\n", max_chars) if piece.strip()]
+
+
+def _pack(parts: List[str], separator: str, max_chars: int) -> List[str]:
+    """Greedily joins consecutive parts (each <= max_chars) into pieces of at most max_chars."""
+    pieces, current, size = [], [], 0
+    for part in parts:
+        added = len(part) + (len(separator) if current else 0)
+        if current and size + added > max_chars:
+            pieces.append(separator.join(current))
+            current, size, added = [], 0, len(part)
+        current.append(part)
+        size += added
+    if current:
+        pieces.append(separator.join(current))
+    return pieces
+
+
+def iter_segments(pages: Iterable[Tuple[int, str]], headings: List[Tuple[int, str, int]]) -> Iterator[Tuple[int, str, str]]:
+    """
+    Cuts the page stream at each heading: yields (level, title, text) per heading in document order.
+    Text before the first heading comes out with level 0. Headings are located on their page by title
+    (whitespace-insensitive); when the title is not found the cut falls at the current position.
+    """
+    by_page = {}
+    for level, title, page in headings:
+        by_page.setdefault(page, []).append((level, title))
+
+    level, title, buffer = 0, None, []
+    for page_number, text in pages:
+        cursor = 0
+        for heading_level, heading_title in by_page.get(page_number, []):
+            found = _find_title(text, heading_title, cursor)
+            position = found if found >= 0 else cursor
+            buffer.append(text[cursor:position])
+            yield level, title, "".join(buffer)
+            level, title, buffer = heading_level, heading_title, []
+            cursor = position
+        buffer.append(text[cursor:])
+    yield level, title, "".join(buffer)
+
+
+def _find_title(text: str, title: str, start: int) -> int:
+    words = title.split()
+    if not words:
+        return -1
+    match = re.compile(r"\s+".join(re.escape(word) for word in words)).search(text, start)
+    return match.start() if match else -1
+
+
+def build_outline_tree(segments: Iterable[Tuple[int, str, str]], max_chars: int = None) -> List[Dict[str, Any]]:
+    """
+    Turns (level, title, text) segments into the chapter/section/subsection dicts stored by MaterialProcessor.
+    The shallowest heading level becomes chapters, the next sections, everything deeper subsections.
+    Text directly under a chapter or section becomes a subsection named after it, and every subsection
+    is split so that none exceeds max_chars.
+    """
+    max_chars = max_chars or max_block_chars()
+    segments = list(segments)
+    depth_of = {level: min(rank + 1, MAX_DEPTH) for rank, level in enumerate(sorted({s[0] for s in segments if s[0] > 0}))}
+
+    chapters = []
+    chapter = section = None
+    for level, title, text in segments:
+        depth = depth_of.get(level, 0)
+        if depth <= 1 or chapter is None:
+            chapter = {"title": title if depth == 1 else "Front Matter", "sections": []}
+            chapters.append(chapter)
+            section = None
+        if depth == 2 or section is None:
+            section = {"title": title if depth == 2 else chapter["title"], "subsections": []}
+            chapter["sections"].append(section)
+        if " ".join(text.split()) != title:  # nothing but the heading itself
+            _add_content(section, title or chapter["title"], text, max_chars)
+
+    return _number(chapters)
+
+
+def build_page_group_tree(groups: Iterable[Tuple[int, int, str]], max_chars: int = None) -> List[Dict[str, Any]]:
+    """Fallback for PDFs without headings: every page group becomes a chapter, split into bounded blocks."""
+    max_chars = max_chars or max_block_chars()
+    chapters = []
+    for first_page, last_page, text in groups:
+        chap_num = len(chapters) + 1
+        section = {"title": f"Section {chap_num}.1", "subsections": []}
+        for i, block in enumerate(split_block(text, max_chars), 1):
+            section["subsections"].append({"title": f"Content Block {chap_num}.1.{i}", "content": block})
+        chapters.append({"title": f"Chapter {chap_num} (Pages {first_page+1}-{last_page+1})", "sections": [section]})
+    return _number(chapters)
+
+
+def _add_content(section: Dict[str, Any], title: str, text: str, max_chars: int):
+    for i, block in enumerate(split_block(text, max_chars)):
+        section["subsections"].append({"title": title if i == 0 else f"{title} (part {i + 1})", "content": block})
+
+
+def _number(chapters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drops empty sections/chapters and assigns 1-based orders."""
+    numbered = []
+    for chapter in chapters:
+        chapter["sections"] = [s for s in chapter["sections"] if s["subsections"]]
+        if not chapter["sections"]:
+            continue
+        for s_order, section in enumerate(chapter["sections"], 1):
+            section["order"] = s_order
+            for sub_order, subsection in enumerate(section["subsections"], 1):
+                subsection["order"] = sub_order
+        numbered.append(chapter)
+    for order, chapter in enumerate(numbered, 1):
+        chapter["order"] = order
+    return numbered
@@ -0,0 +1,86 @@
+"""
+Ingestion worker: claims queued IngestionJobs and runs them outside the API process.
+
+    python -m backend.ingestion.worker --concurrency 2
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def run_worker(poll_interval: float = None, burst: bool = False):
+    """Claim -> process -> finish loop for one worker process. `burst` exits once the queue is empty."""
+    from ..database.session import SessionLocal
+    from .jobs import claim_next_job, finish_job, job_heartbeat, requeue_stale_jobs, worker_name
+    from .processor import IngestionError, MaterialProcessor
+
+    poll_interval = poll_interval or float(os.getenv("INGESTION_POLL_SECONDS", "2"))
+    worker_id = worker_name()
+    print(f"[*] Ingestion worker {worker_id} started")
+
+    db = SessionLocal()
+    try:
+        while True:
+            requeued = requeue_stale_jobs(db)
+            if requeued:
+                print(f"[!] Requeued {requeued} stale ingestion jobs")
+
+            job = claim_next_job(db, worker_id)
+            if job is None:
+                if burst:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            print(f"[*] Job {job.id}: course {job.course_id}, {os.path.basename(job.file_path)} (attempt {job.attempts}/{job.max_attempts})")
+            start_time = time.time()
+            try:
+                with job_heartbeat(SessionLocal, job.id, worker_id):
+                    succeeded = MaterialProcessor(db).process_material(job.course_id, job.file_path, job.file_type,
+                                                                          job.source_hash)
+                error, retry = None, True
+            except IngestionError as e:
+                db.rollback()
+                succeeded, error, retry = False, str(e), False
+            except Exception as e:
+                db.rollback()
+                succeeded, error, retry = False, f"{type(e).__name__}: {e}", True
+            finish_job(db, job, succeeded, error, retry)
+            print(f"    -> Job {job.id} {job.status.value} in {time.time() - start_time:.2f}s")
+    finally:
+        db.close()
+
+
+def main(concurrency: int = 1, poll_interval: float = None, burst: bool = False):
+    from ..database.session import init_db
+    init_db()
+
+    if concurrency <= 1:
+        run_worker(poll_interval, burst)
+        return
+
+    # One process per slot: extraction and chunking are CPU-bound, so threads would share one GIL
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(poll_interval, burst)) for _ in range(concurrency)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs queued course-material ingestion jobs.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("INGESTION_WORKER_CONCURRENCY", "1")),
+                        help="Worker processes (jobs processed in parallel)")
+    parser.add_argument("--poll-interval", type=float, default=None, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+    main(args.concurrency, args.poll_interval, args.burst)
@@ -1,5 +1,6 @@
+import asyncio
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -10,6 +11,13 @@ class LLMService:
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
         self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         self.model_name = os.getenv("LLM_MODEL", "deepseek/deepseek-r1-0528:free")
+        # Async API: requests in flight per event loop and the per-request timeout
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        # One pooled AsyncOpenAI client (keep-alive connections) per event loop, created on first use
+        self._async_loop = None
+        self._async_client = None
+        self._async_limit = None
         
         # Initialize Google if key is present and model is gemini
         self.use_google = False
@@ -32,39 +40,90 @@ class LLMService:
         """Generates text content using either Google directly or OpenRouter."""
         try:
             if self.use_google:
-                full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-                response = self.google_model.generate_content(full_prompt)
-                
-                # Safety check: response.text might raise if blocked
-                try:
-                    if response and response.text:
-                        return response.text
-                    return "ERROR: Empty response from AI."
-                except (AttributeError, ValueError) as e:
-                    print(f"[*] Google AI Blocked/Empty Response: {e}")
-                    return "ERROR: The AI was unable to generate a response for this topic."
+                response = self.google_model.generate_content(self._google_prompt(prompt, system_prompt))
+                return self._google_text(response)
             else:
-                messages = []
-                if system_prompt:
-                    messages.append({"role": "system", "content": system_prompt})
-                messages.append({"role": "user", "content": prompt})
-                
                 completion = self.client.chat.completions.create(
                     model=self.model_name,
-                    messages=messages,
+                    messages=self._messages(prompt, system_prompt),
                     max_tokens=4000,
                     temperature=0.7
                 )
-                if not completion or not completion.choices:
-                    return "ERROR: No response from OpenRouter."
-                return completion.choices[0].message.content
+                return self._completion_text(completion)
         except (Exception, StopIteration) as e:
             # Prevent StopIteration leaking in generators/coroutines or unexpected HuggingFace/AI library behaviors
-            error_str = str(e)
-            print(f"LLM Error during generation: {error_str}")
-            if "429" in error_str or "rate_limit" in error_str.lower():
-                return "ERROR_RATE_LIMIT"
-            return f"ERROR: AI generation failed. Details: {error_str[:100]}"
+            return self._error_text(e)
+
+    async def generate_content_async(self, prompt: str, system_prompt: str = None) -> str:
+        """
+        Non-blocking generate_content for async endpoints: the request is awaited on the event loop
+        (no threadpool thread is held while the model thinks). Same return values and error strings.
+        """
+        try:
+            client, limit = self._get_async_client()
+            async with limit:
+                if self.use_google:
+                    # The Google SDK has no client-level timeout like AsyncOpenAI's
+                    response = await asyncio.wait_for(
+                        self.google_model.generate_content_async(self._google_prompt(prompt, system_prompt)),
+                        self.timeout,
+                    )
+                    return self._google_text(response)
+                completion = await client.chat.completions.create(
+                    model=self.model_name,
+                    messages=self._messages(prompt, system_prompt),
+                    max_tokens=4000,
+                    temperature=0.7
+                )
+            return self._completion_text(completion)
+        except (Exception, StopIteration) as e:
+            return self._error_text(e)
+
+    def _get_async_client(self):
+        """The pooled AsyncOpenAI client (None for Google) and concurrency limit of the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # Connections of a client are bound to the loop that opened them
+            self._async_client = None if self.use_google else AsyncOpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=self.openrouter_api_key,
+                timeout=self.timeout,
+            )
+            self._async_limit = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_client, self._async_limit
+
+    def _google_prompt(self, prompt: str, system_prompt: str = None) -> str:
+        return f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+    def _messages(self, prompt: str, system_prompt: str = None):
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _google_text(self, response) -> str:
+        # Safety check: response.text might raise if blocked
+        try:
+            if response and response.text:
+                return response.text
+            return "ERROR: Empty response from AI."
+        except (AttributeError, ValueError) as e:
+            print(f"[*] Google AI Blocked/Empty Response: {e}")
+            return "ERROR: The AI was unable to generate a response for this topic."
+
+    def _completion_text(self, completion) -> str:
+        if not completion or not completion.choices:
+            return "ERROR: No response from OpenRouter."
+        return completion.choices[0].message.content
+
+    def _error_text(self, e: BaseException) -> str:
+        error_str = str(e) or type(e).__name__
+        print(f"LLM Error during generation: {error_str}")
+        if "429" in error_str or "rate_limit" in error_str.lower():
+            return "ERROR_RATE_LIMIT"
+        return f"ERROR: AI generation failed. Details: {error_str[:100]}"
 
 # Global instance
 llm = LLMService()
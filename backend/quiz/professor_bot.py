@@ -7,6 +7,8 @@ from ..database.models.transcript import Quiz
 from ..database.models.hierarchy import Chapter, Section, Subsection
 from .planner import TopicPlanner
 from .llm_service import llm
+from ..database.session import release_connection
+from fastapi.concurrency import run_in_threadpool
 
 
 class ProfessorBot:
@@ -66,6 +68,41 @@ class ProfessorBot:
             phase=phase
         )
 
+    async def generate_single_question_async(self, chunk: Chunk, course_id: int = None, author: str = None, student_struggled: bool = False, history_turns: List[Dict[str, str]] = None, progression_type: str = "FUNDAMENTAL", phase: str = "PHASE 1", instructions: str = None):
+        """
+        Async generate_single_question: DB work runs in the threadpool, the LLM call is awaited on the event loop.
+        The examiner instructions are passed per call (never via self.instructions), so interleaved
+        requests cannot pick up each other's instructions while one of them awaits the model.
+        The DB transaction is ended before the await, so no pooled connection is held meanwhile.
+        """
+        if not chunk:
+            return None
+
+        def build_prompts():
+            related_chunks = self._fetch_graph_relations(chunk.id)
+            feedback_examples = self._get_feedback_context(course_id) if course_id else ""
+            return self._build_question_prompts(
+                chunk,
+                author=author,
+                related_chunks=related_chunks,
+                student_struggled=student_struggled,
+                history_turns=history_turns,
+                feedback_examples=feedback_examples,
+                progression_type=progression_type,
+                phase=phase,
+                instructions=instructions
+            )
+
+        def build_and_release():
+            prompts = build_prompts()
+            release_connection(self.db)
+            return prompts
+
+        user_prompt, system_prompt = await run_in_threadpool(build_and_release)
+        print(f"DEBUG: Generating assessment question for Chunk ID: {chunk.id} (Struggle: {student_struggled}, Progression: {progression_type})")
+        raw_text = (await self.llm.generate_content_async(user_prompt, system_prompt=system_prompt)).strip()
+        return await run_in_threadpool(self._store_question, chunk, raw_text)
+
     def _get_feedback_context(self, course_id: int) -> str:
         """Fetches upvoted and downvoted questions to reinforce the teacher's style preferences."""
         from ..database.models.question import Question
@@ -92,14 +129,26 @@ class ProfessorBot:
         return context
 
     def _fetch_graph_relations(self, chunk_id: int):
-        """Fetches chunks connected via the deterministic KnowledgeRelation graph."""
+        """Fetches the strongest chunks connected via the KnowledgeRelation graph (highest weight first)."""
         from ..database.models.chunk import Chunk, KnowledgeRelation, ChunkType
-        relations = self.db.query(KnowledgeRelation).filter_by(source_id=chunk_id).limit(2).all()
+        relations = self.db.query(KnowledgeRelation).filter_by(source_id=chunk_id).order_by(
+            KnowledgeRelation.weight.desc().nulls_last(), KnowledgeRelation.id
+        ).limit(2).all()
         return [self.db.query(Chunk).get(rel.target_id) for rel in relations]
 
     def _create_question_from_m_chunk(self, chunk: Chunk, author: str = None, related_chunks: List[Chunk] = None, student_struggled: bool = False, history_turns: List[Dict[str, str]] = None, feedback_examples: str = "", progression_type: str = "FUNDAMENTAL", phase: str = "PHASE 1"):
         """Generates a question following structural assessment logic with high-fidelity system instruction compliance and teacher feedback adaptation."""
-        
+        user_prompt, system_prompt = self._build_question_prompts(
+            chunk, author, related_chunks, student_struggled, history_turns, feedback_examples, progression_type, phase,
+            self.instructions
+        )
+
+        print(f"DEBUG: Generating assessment question for Chunk ID: {chunk.id} (Struggle: {student_struggled}, Progression: {progression_type})")
+        raw_text = self.llm.generate_content(user_prompt, system_prompt=system_prompt).strip()
+        return self._store_question(chunk, raw_text)
+
+    def _build_question_prompts(self, chunk: Chunk, author: str = None, related_chunks: List[Chunk] = None, student_struggled: bool = False, history_turns: List[Dict[str, str]] = None, feedback_examples: str = "", progression_type: str = "FUNDAMENTAL", phase: str = "PHASE 1", instructions: str = None):
+        """(user prompt, system prompt) for one question. Touches lazy chunk relations, so it needs the DB."""
         graph_context = ""
         if related_chunks:
             graph_context = "\n### RELATED COMPARATIVE MATERIALS:\n"
@@ -128,7 +177,7 @@ class ProfessorBot:
         You are an elite academic examiner. You MUST strictly adhere to the STYLE GUIDELINE below.
         
         [STYLE GUIDELINE]
-        {self.instructions if self.instructions else "Standard academic tone, professional and concise."}
+        {instructions if instructions else "Standard academic tone, professional and concise."}
         {feedback_examples}
 
         [PROGRESSION MODE]
@@ -145,7 +194,7 @@ class ProfessorBot:
         {greeting_constraint}
 
         [PRIMARY DIRECTIVE]
-        You MUST strictly follow these instructions: {self.instructions if self.instructions else "None."}
+        You MUST strictly follow these instructions: {instructions if instructions else "None."}
         
         [SOURCE MATERIAL]
         READING AUTHOR: {author_display}
@@ -163,14 +212,14 @@ class ProfessorBot:
         Ideal Answer: [One-sentence summary]
 
         ### FINAL CHECK: 
-        Did you follow the instructions? -> {self.instructions if self.instructions else "N/A"}
+        Did you follow the instructions? -> {instructions if instructions else "N/A"}
         """
 
-        system_prompt = self.instructions if self.instructions else "You are an expert academic examiner."
+        system_prompt = instructions if instructions else "You are an expert academic examiner."
+        return user_prompt, system_prompt
 
-        print(f"DEBUG: Generating assessment question for Chunk ID: {chunk.id} (Struggle: {student_struggled}, Progression: {progression_type})")
-        raw_text = self.llm.generate_content(user_prompt, system_prompt=system_prompt).strip()
-        
+    def _store_question(self, chunk: Chunk, raw_text: str) -> Question:
+        """Parses the model output into a PENDING Question for the chunk and saves it."""
         # Parse the structured response
         q_text, a_text = self._parse_ai_response(raw_text)
 
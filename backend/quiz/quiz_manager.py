@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from ..database.models.question import Question, QuestionStatus
 from ..database.models.transcript import Transcript, Quiz
 from ..rag.evaluation import EvaluationService
+from ..database.session import release_connection
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 
 class QuizManager:
@@ -27,21 +29,45 @@ class QuizManager:
         Evaluation is NOT performed here to maximize throughput.
         """
         # Perform Evaluation
-        from ..database.models.question import Question
-        question = self.db.query(Question).get(question_id)
-        
+        eval_request = self._evaluation_request(quiz_id, question_id, answer_text)
+        eval_result = {"score": 0.0, "reasoning": "Evaluation failed"}
+        if eval_request:
+            eval_result = self.eval_service.evaluate_answer(**eval_request)
+
+        return self._log_transcript(quiz_id, question_id, answer_text, eval_result, student_name, enrollment_id)
+
+    async def submit_answer_async(self, quiz_id: int, question_id: int, answer_text: str, student_name: str = None, enrollment_id: str = None):
+        """
+        Async submit_answer: DB work runs in the threadpool, the evaluation LLM call is awaited with no
+        transaction open (the evaluation ends its own transaction too, after retrieval).
+        """
+        def request_and_release():
+            eval_request = self._evaluation_request(quiz_id, question_id, answer_text)
+            release_connection(self.db)
+            return eval_request
+
+        eval_request = await run_in_threadpool(request_and_release)
         eval_result = {"score": 0.0, "reasoning": "Evaluation failed"}
-        if question:
-            quiz = self.db.query(Quiz).get(quiz_id)
-            instructions = quiz.instructions if quiz else None
-            
-            eval_result = self.eval_service.evaluate_answer(
-                question_text=question.question_text,
-                student_answer=answer_text,
-                ideal_answer=question.ideal_answer,
-                instructions=instructions
-            )
+        if eval_request:
+            eval_result = await self.eval_service.evaluate_answer_async(**eval_request)
+
+        return await run_in_threadpool(self._log_transcript, quiz_id, question_id, answer_text, eval_result, student_name, enrollment_id)
+
+    def _evaluation_request(self, quiz_id: int, question_id: int, answer_text: str):
+        """evaluate_answer arguments for the question (None when the question does not exist)."""
+        question = self.db.query(Question).get(question_id)
+        if not question:
+            return None
+        quiz = self.db.query(Quiz).get(quiz_id)
+        return {
+            "question_text": question.question_text,
+            "student_answer": answer_text,
+            "ideal_answer": question.ideal_answer,
+            "instructions": quiz.instructions if quiz else None,
+            "course_id": quiz.course_id if quiz else None,
+        }
 
+    def _log_transcript(self, quiz_id: int, question_id: int, answer_text: str, eval_result: dict, student_name: str = None, enrollment_id: str = None):
         # Log Transcript (Academic Audit)
         transcript = Transcript(
             student_name=student_name,
@@ -1,39 +1,89 @@
 from huggingface_hub import InferenceClient
-import faiss
 import numpy as np
 from sqlalchemy.orm import Session
-from ..database.models.chunk import Chunk, ChunkType
+from ..database.models.chunk import Chunk, ChunkType, load_span_texts
+from ..database.models.hierarchy import Chapter, Section, Subsection
+from .embedding_cache import EmbeddingCache
+from .index_store import CourseIndexStore, get_shared_store
+from .query_cache import query_cache
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import List, Tuple
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Process-wide Hugging Face clients, one per model
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_embedding_client(model_name: str) -> InferenceClient:
+    with _clients_lock:
+        if model_name not in _clients:
+            if os.getenv("EMBEDDING_BACKEND", "hf").lower() == "stub":
+                print(f"[*] Using offline stub embeddings for {model_name} (EMBEDDING_BACKEND=stub)")
+                _clients[model_name] = StubEmbeddingClient()
+            else:
+                print(f"[*] Initializing Hugging Face Embedding Client: {model_name}")
+                _clients[model_name] = InferenceClient(model=model_name, token=os.getenv("HF_TOKEN"))
+        return _clients[model_name]
+
+class StubEmbeddingClient:
+    """
+    Offline stand-in for InferenceClient.feature_extraction (benchmarks, local dev):
+    deterministic unit vectors seeded from the text hash. Not semantically meaningful.
+    """
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+
+    def feature_extraction(self, text):
+        import hashlib
+        texts = [text] if isinstance(text, str) else list(text)
+        vectors = np.empty((len(texts), self.dimension), dtype='float32')
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little")
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dimension)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if isinstance(text, str) else vectors
+
 class Embedder:
-    def __init__(self, db: Session, model_name: str = "BAAI/bge-large-en-v1.5"):
+    def __init__(self, db: Session, model_name: str = "BAAI/bge-large-en-v1.5", batch_size: int = None, max_concurrency: int = None, read_only: bool = False):
         self.db = db
         self.model_name = model_name
         # BGE-Large-en-v1.5 dimension is 1024
         self.dimension = 1024 
-        self.index_path = "faiss_index/index.faiss"
-        self.hf_token = os.getenv("HF_TOKEN")
-        
-        print(f"[*] Initializing Hugging Face Embedding Client: {self.model_name}")
-        self.client = InferenceClient(model=self.model_name, token=self.hf_token)
-        
-        if os.path.exists(self.index_path):
-            try:
-                self.index = faiss.read_index(self.index_path)
-                if self.index.d != self.dimension:
-                    print(f"[!] FAISS Dimension Mismatch ({self.index.d} vs {self.dimension}). Re-initializing index.")
-                    self.index = faiss.IndexFlatL2(self.dimension)
-            except Exception:
-                self.index = faiss.IndexFlatL2(self.dimension)
-        else:
-            self.index = faiss.IndexFlatL2(self.dimension)
+
+        # Batching: texts per request, requests in flight, and a soft payload cap per request
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", "32"))
+        self.max_concurrency = max_concurrency or int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+        self.max_batch_chars = int(os.getenv("EMBED_MAX_BATCH_CHARS", "60000"))
+        # Cumulative throughput counters for the lifetime of this embedder
+        self.embedded_count = 0
+        self.embedding_seconds = 0.0
+        # Content-addressed vector cache, opened on first use (query-only embedders never touch it)
+        self._cache = None
+        # Vectors computed ahead of indexing (e.g. for embedding-driven chunk merging), reused by embed_texts
+        self.known_vectors = {}
+
+        self.client = get_embedding_client(self.model_name)
+
+        # One lazily loaded FAISS shard per course (faiss_index/course_<id>/index.faiss).
+        # Read-only embedders share the process-wide memory-mapped registry instead of reading from disk.
+        self.store = get_shared_store(self.dimension) if read_only else CourseIndexStore(self.dimension)
+
+    @property
+    def cache(self):
+        """Content-addressed vector cache: unchanged texts are never sent to the API twice."""
+        if self._cache is None and os.getenv("EMBED_CACHE", "1") != "0":
+            self._cache = EmbeddingCache(self.model_name, self.dimension)
+        return self._cache
 
     def embed_chunks(self, subsection_id: int):
         """
-        Embeds chunks locally using SentenceTransformers (Free & Unlimited).
+        Embeds the S/M chunks of a subsection via batched Hugging Face requests and indexes them.
         """
         print(f"\n{'-'*20} LOCAL VECTORIZATION START {'-'*20}")
         chunks = self.db.query(Chunk).filter(
@@ -45,75 +95,282 @@ class Embedder:
             print(f"[!] No chunks found to embed for subsection {subsection_id}")
             return
 
-        texts = [c.content for c in chunks]
-        print(f"[*] Encoding {len(texts)} chunks via Hugging Face API...")
-        
-        # Hugging Face Inference API
-        all_embeddings = []
-        for text in texts:
-            try:
-                emb = self.client.feature_extraction(text)
-                all_embeddings.append(emb)
-            except (Exception, StopIteration) as e:
+        course_id = self.course_id_for_subsection(subsection_id)
+        self.index_chunks(chunks, course_id)
+        print(f"{'-'*20} LOCAL VECTORIZATION COMPLETE {'-'*17}\n")
+
+        self._save_index(course_id)
+
+    def index_chunks(self, chunks: List[Chunk], course_id: int):
+        """Embeds the given chunks in batches and upserts them into the course shard under their chunk ids."""
+        print(f"[*] Encoding {len(chunks)} chunks via Hugging Face API...")
+        embeddings = self.embed_texts([c.content for c in chunks])
+
+        print(f"[*] Syncing {len(embeddings)} vectors to FAISS shard for course {course_id}...")
+        self.upsert(course_id, [c.id for c in chunks], embeddings)
+
+        for chunk in chunks:
+            chunk.vector_id = str(chunk.id)
+
+        self.db.commit()
+        print(f"      -> SUCCESS: Sub-total indexed vectors for course {course_id}: {self.store.get(course_id).ntotal}")
+
+    def add(self, course_id: int, chunk_ids: List[int], embeddings: np.ndarray):
+        """Adds vectors to the course shard keyed by chunk id."""
+        if not len(chunk_ids):
+            return
+        self.store.add(course_id, np.asarray(chunk_ids, dtype='int64'), embeddings)
+
+    def remove(self, course_id: int, chunk_ids: List[int]) -> int:
+        """Removes the vectors of the given chunk ids from the course shard; returns how many were removed."""
+        if not len(chunk_ids):
+            return 0
+        return self.store.remove(course_id, np.asarray(chunk_ids, dtype='int64'))
+
+    def upsert(self, course_id: int, chunk_ids: List[int], embeddings: np.ndarray):
+        """Replaces (or inserts) the vectors stored for the given chunk ids."""
+        self.remove(course_id, chunk_ids)
+        self.add(course_id, chunk_ids, embeddings)
+
+    def remove_subsection(self, subsection_id: int, course_id: int = None) -> int:
+        """Drops the vectors of every chunk in a subsection (e.g. before it is re-chunked)."""
+        chunk_ids = [row[0] for row in self.db.query(Chunk.id).filter(Chunk.subsection_id == subsection_id).all()]
+        if course_id is None:
+            course_id = self.course_id_for_subsection(subsection_id)
+        return self.remove(course_id, chunk_ids)
+
+    def course_id_for_subsection(self, subsection_id: int) -> int:
+        row = self.db.query(Chapter.course_id).join(Section).join(Subsection).filter(Subsection.id == subsection_id).first()
+        return row[0] if row else None
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds texts with list-valued requests, keeping at most `max_concurrency` batches in flight.
+        Cached vectors are reused; only cache misses hit the API.
+        Returns a (len(texts), dimension) float32 matrix in the original order.
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype='float32')
+
+        start_time = time.time()
+        if self.cache:
+            embeddings, missing = self.cache.lookup(texts)
+        else:
+            embeddings, missing = np.zeros((len(texts), self.dimension), dtype='float32'), list(range(len(texts)))
+        if self.known_vectors:
+            still_missing = []
+            for i in missing:
+                vector = self.known_vectors.get(texts[i])
+                if vector is None:
+                    still_missing.append(i)
+                else:
+                    embeddings[i] = vector
+            missing = still_missing
+
+        # Identical texts within one call are embedded once
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        batches = self._plan_batches(unique_texts) if unique_texts else []
+        if unique_texts:
+            fresh = np.zeros((len(unique_texts), self.dimension), dtype='float32')
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                futures = [(start, pool.submit(self._embed_batch, unique_texts[start:end])) for start, end in batches]
+                for start, future in futures:
+                    vectors = future.result()
+                    fresh[start:start + len(vectors)] = vectors
+
+            positions = {text: row for row, text in enumerate(unique_texts)}
+            for i in missing:
+                embeddings[i] = fresh[positions[texts[i]]]
+
+            if self.cache:
+                # Zero vectors are failed embeddings and must not be cached
+                ok = np.any(fresh != 0, axis=1)
+                self.cache.store([t for t, keep in zip(unique_texts, ok) if keep], fresh[ok])
+                self.cache.flush()
+
+        duration = time.time() - start_time
+        self.embedded_count += len(texts)
+        self.embedding_seconds += duration
+        rate = len(texts) / duration if duration > 0 else float("inf")
+        print(f"      -> Embedded {len(texts)} texts ({len(texts) - len(missing)} cached, {len(batches)} API batches) in {duration:.2f}s ({rate:.1f} chunks/s)")
+        return embeddings
+
+    def remember(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds texts not seen yet in one batched pass and keeps their vectors for this embedder's later
+        embed_texts calls, so chunking decisions and the index share one embedding per text.
+        Returns a (len(texts), dimension) matrix in the original order.
+        """
+        unseen = [text for text in dict.fromkeys(texts) if text not in self.known_vectors]
+        if unseen:
+            for text, vector in zip(unseen, self.embed_texts(unseen)):
+                if vector.any():  # failed (zero) embeddings are retried when indexing
+                    self.known_vectors[text] = vector
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            if text in self.known_vectors:
+                vectors[i] = self.known_vectors[text]
+        return vectors
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embeds a search query as a (1, dimension) matrix, reusing recent results from the query cache."""
+        cached = query_cache.get(self.model_name, query)
+        if cached is not None:
+            return cached
+        vector = self._to_matrix(self.client.feature_extraction(query))
+        query_cache.put(self.model_name, query, vector)
+        return vector
+
+    def report_throughput(self):
+        """Prints the cumulative embedding throughput of this embedder."""
+        if not self.embedded_count:
+            return
+        rate = self.embedded_count / self.embedding_seconds if self.embedding_seconds > 0 else float("inf")
+        print(f"[*] Embedding throughput: {self.embedded_count} chunks in {self.embedding_seconds:.2f}s ({rate:.1f} chunks/s)")
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"[*] Embedding cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate, {stats['entries']} stored)")
+
+    def _plan_batches(self, texts: List[str]):
+        """Splits texts into contiguous (start, end) ranges bounded by batch size and payload length."""
+        batches = []
+        start, chars = 0, 0
+        for i, text in enumerate(texts):
+            size = len(text or "")
+            if i > start and (i - start >= self.batch_size or chars + size > self.max_batch_chars):
+                batches.append((start, i))
+                start, chars = i, 0
+            chars += size
+        batches.append((start, len(texts)))
+        return batches
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embeds one batch; a failing batch is halved and retried until single texts fall back to zero vectors."""
+        try:
+            vectors = self._to_matrix(self.client.feature_extraction(texts))
+            if vectors.shape != (len(texts), self.dimension):
+                raise ValueError(f"Unexpected embedding shape {vectors.shape} for {len(texts)} texts")
+            return vectors
+        except (Exception, StopIteration) as e:
+            if len(texts) == 1:
                 print(f"[!] Embedding Error for text: {e}")
                 # Fallback to zero vector if one chunk fails
-                all_embeddings.append([0.0] * self.dimension)
-            
-        embeddings = np.array(all_embeddings).astype('float32')
-        
-        # Add to FAISS and map IDs
-        print(f"[*] Syncing {len(embeddings)} vectors to FAISS...")
-        start_idx = self.index.ntotal
-        self.index.add(embeddings)
-        
-        for i, chunk in enumerate(chunks):
-            chunk.vector_id = str(start_idx + i)
-        
-        self.db.commit()
-        print(f"      -> SUCCESS: Sub-total indexed vectors: {self.index.ntotal}")
-        print(f"{'-'*20} LOCAL VECTORIZATION COMPLETE {'-'*17}\n")
+                return np.zeros((1, self.dimension), dtype='float32')
+            mid = len(texts) // 2
+            print(f"[!] Embedding batch of {len(texts)} failed ({e}). Splitting into {mid} + {len(texts) - mid}...")
+            return np.vstack([self._embed_batch(texts[:mid]), self._embed_batch(texts[mid:])])
 
-        self._save_index()
+    def _to_matrix(self, response) -> np.ndarray:
+        """Normalizes an API response into a 2-D float32 matrix (one row per input text)."""
+        vectors = np.asarray(response, dtype='float32')
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        elif vectors.ndim == 3:
+            # Token-level output: mean-pool into one vector per text
+            vectors = vectors.mean(axis=1)
+        return vectors
 
-    def _save_index(self):
-        if not os.path.exists("faiss_index"):
-            os.makedirs("faiss_index" )
-        faiss.write_index(self.index, self.index_path)
+    def _save_index(self, course_id: int):
+        self.store.save(course_id)
 
-    def reset_index(self):
-        """Wipes the FAISS index and deletes the disk cache."""
-        print("[*] Resetting FAISS Vector Index...")
-        self.index = faiss.IndexFlatL2(self.dimension)
-        if os.path.exists(self.index_path):
-            os.remove(self.index_path)
+    def reset_index(self, course_id: int = None):
+        """Wipes the FAISS shard of one course (or every shard when no course is given)."""
+        if course_id is None:
+            print("[*] Resetting ALL FAISS Vector Index shards...")
+            self.store.reset_all()
+        else:
+            print(f"[*] Resetting FAISS Vector Index for course {course_id}...")
+            self.store.reset(course_id)
         print("    -> FAISS Index Cleared.")
 
+# Only these chunk types are embedded; filters covering both need no over-fetching
+INDEXED_CHUNK_TYPES = {ChunkType.SMALL, ChunkType.MEDIUM}
+# Chunk ids per resolve query (SQLite allows at most 32766 bound parameters, older builds 999)
+RESOLVE_BATCH = int(os.getenv("RAG_RESOLVE_BATCH", "900"))
+
 class RAGService:
     def __init__(self, db: Session, embedder: Embedder):
         self.db = db
         self.embedder = embedder
+        self.overfetch_factor = float(os.getenv("RAG_OVERFETCH_FACTOR", "4"))
+        if self.overfetch_factor <= 1:
+            raise ValueError(f"RAG_OVERFETCH_FACTOR must be greater than 1, got {self.overfetch_factor}")
 
-    def retrieve(self, query: str, top_k: int = 3, chunk_types: list = None):
+    def retrieve(self, query: str, top_k: int = 3, chunk_types: list = None, course_id: int = None):
         """
         Retrieves chunks using Hugging Face embeddings and FAISS similarity.
+        When a course is given only its shard is searched; otherwise all shards are merged by distance.
+        """
+        return [chunk for chunk, _ in self.search(query, top_k=top_k, chunk_types=chunk_types, course_id=course_id)]
+
+    def search(self, query: str, top_k: int = 3, chunk_types: list = None, course_id: int = None) -> List[Tuple[Chunk, float]]:
+        """
+        Returns up to top_k (chunk, L2 distance) pairs of the requested types in ranked order.
+        Type filters over-fetch adaptively until top_k matches are found or the shard is exhausted.
         """
         try:
-            query_embedding = self.embedder.client.feature_extraction(query)
-            query_embedding = np.array(query_embedding).astype('float32').reshape(1, -1)
+            query_embedding = self.embedder.embed_query(query)
         except (Exception, StopIteration) as e:
             print(f"[!] RAG Retrieval Embedding Error: {e}")
             return []
-        
-        distances, indices = self.embedder.index.search(query_embedding, top_k)
-        
-        results = []
-        for idx in indices[0]:
-            if idx == -1: continue
-            chunk = self.db.query(Chunk).filter_by(vector_id=str(idx)).first()
-            if chunk:
-                if chunk_types and chunk.chunk_type not in chunk_types:
-                    continue
-                results.append(chunk)
-        
-        return results
 
+        if chunk_types and not INDEXED_CHUNK_TYPES.intersection(chunk_types):
+            return []  # e.g. LARGE chunks are never embedded: no hit can match
+
+        course_ids = [course_id] if course_id is not None else self.embedder.store.course_ids()
+        shards = [index for index in (self._shard(cid) for cid in course_ids) if index is not None and index.ntotal > 0]
+        total = sum(index.ntotal for index in shards)
+        if not total:
+            return []
+
+        filtered = bool(chunk_types) and not INDEXED_CHUNK_TYPES.issubset(chunk_types)
+        fetch_k = min(self._grow(top_k) if filtered else top_k, total)
+        results, seen = [], set()
+        while True:
+            # Each round only resolves the hits the previous rounds did not return
+            hits = [hit for hit in self._search_shards(shards, query_embedding, fetch_k) if hit[1] not in seen]
+            seen.update(chunk_id for _, chunk_id in hits)
+            results.extend(self._resolve(hits, chunk_types))
+            if len(results) >= top_k or fetch_k >= total:
+                results.sort(key=lambda r: r[1])
+                return results[:top_k]
+            fetch_k = min(self._grow(fetch_k), total)
+
+    def _shard(self, course_id: int):
+        """The course shard, or None (logged) when it cannot be read: one bad shard must not fail every search."""
+        try:
+            return self.embedder.store.get(course_id)
+        except Exception as e:
+            print(f"[!] RAG Retrieval: skipping course {course_id} shard ({e})")
+            return None
+
+    def _grow(self, k: int) -> int:
+        """Next over-fetch size: always larger than k, so the search loop reaches the shard size."""
+        return max(k + 1, int(k * self.overfetch_factor))
+
+    def _search_shards(self, shards, query_embedding: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Searches every shard and merges the hits as (distance, chunk id), nearest first."""
+        hits = []
+        for index in shards:
+            distances, ids = index.search(query_embedding, min(k, index.ntotal))
+            hits.extend((float(dist), int(chunk_id)) for dist, chunk_id in zip(distances[0], ids[0]) if chunk_id != -1)
+        hits.sort(key=lambda h: h[0])
+        return hits[:k]
+
+    def _resolve(self, hits: List[Tuple[float, int]], chunk_types: list = None) -> List[Tuple[Chunk, float]]:
+        """
+        FAISS ids are chunk primary keys: resolves (and type-filters) the hits in one round-trip per
+        RESOLVE_BATCH ids, keeping the IN list under the database's bind-parameter limit.
+        """
+        chunks_by_id = {}
+        for start in range(0, len(hits), RESOLVE_BATCH):
+            query_chunks = self.db.query(Chunk) \
+                .filter(Chunk.id.in_([chunk_id for _, chunk_id in hits[start:start + RESOLVE_BATCH]]))
+            if chunk_types:
+                query_chunks = query_chunks.filter(Chunk.chunk_type.in_(chunk_types))
+            chunks = query_chunks.all()
+            # Span texts come from the slice cache; only the missing spans are sliced, in SQL
+            load_span_texts(self.db, chunks)
+            chunks_by_id.update((chunk.id, chunk) for chunk in chunks)
+
+        return [(chunks_by_id[chunk_id], dist) for dist, chunk_id in hits if chunk_id in chunks_by_id]
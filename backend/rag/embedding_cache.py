@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is only safe within one process
+    fcntl = None
+
+load_dotenv()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, disk-backed store of embedding vectors, shared by every process using the same
+    cache directory (API and ingestion workers). Vectors live in a memory-mapped float32 matrix; an
+    append-only log maps sha256(model_name, normalized text) -> row. Each process replays what the
+    others appended, under a file lock, before reading rows or allocating new ones.
+    """
+
+    def __init__(self, model_name: str, dimension: int, cache_dir: str = None, max_entries: int = None):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries or int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+        base_dir = cache_dir or os.getenv("EMBED_CACHE_DIR", "embedding_cache")
+        self.cache_dir = os.path.join(base_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self.index_path = os.path.join(self.cache_dir, "index.log")
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> row, least recently used first (LRU order is per process)
+        self._row_keys = {}  # row -> key
+        self._free_rows = []  # may hold rows since taken by another process; checked on allocation
+        self._capacity = 0
+        self._vectors = None
+        self._index_file = None  # append handle on the log
+        self._index_inode = None
+        self._index_offset = 0  # bytes of the log already replayed
+        self._index_entries = 0  # entry lines in the log, live or superseded
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self.cache_dir, ".lock"), "a")
+        with self._locked(exclusive=True):
+            self._load()
+
+    # --- Public API ---
+
+    def key(self, text: str) -> str:
+        normalized = " ".join((text or "").split())
+        return hashlib.sha256(f"{self.model_name}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """Returns a matrix with cached rows filled in, plus the positions that missed."""
+        found = np.zeros((len(texts), self.dimension), dtype="float32")
+        missing = []
+        with self._locked(exclusive=False):
+            self._sync()
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                row = self._slots.get(key)
+                if row is None:
+                    missing.append(i)
+                    continue
+                self._slots.move_to_end(key)
+                found[i] = self._vectors[row]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return found, missing
+
+    def store(self, texts: List[str], vectors: np.ndarray):
+        """Caches vectors for texts, evicting the least recently used entries beyond `max_entries`."""
+        with self._locked(exclusive=True):
+            self._sync()
+            lines = []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key in self._slots:  # same model and text: the cached vector is this one
+                    self._slots.move_to_end(key)
+                    continue
+                row = self._allocate_row()
+                self._vectors[row] = vector
+                self._assign(key, row)
+                lines.append(f"{key} {row}\n")
+            if lines:
+                self._append(lines)
+
+    def flush(self):
+        """Writes the mapped vectors back to disk (index entries are appended as they are stored)."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # --- Internals ---
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Threads queue on the in-process lock; processes share (reads) or exclude (writes) via flock()."""
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _header(self) -> str:
+        return json.dumps({"model_name": self.model_name, "dimension": self.dimension}) + "\n"
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    meta = json.loads(f.readline())
+                if meta.get("dimension") == self.dimension:
+                    self._reload()
+                    print(f"[*] Embedding cache loaded: {len(self._slots)} vectors ({self.cache_dir})")
+                    return
+                print(f"[!] Embedding cache dimension mismatch. Starting a fresh cache.")
+            except Exception as e:
+                print(f"[!] Embedding cache unreadable ({e}). Starting a fresh cache.")
+        self._rewrite_index([])
+
+    def _rewrite_index(self, entries):
+        """Atomically replaces the log with `entries`; other processes reload when they see the new file."""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self._header())
+            f.writelines(f"{key} {row}\n" for key, row in entries)
+        os.replace(tmp_path, self.index_path)
+        self._reload()
+
+    def _reload(self):
+        """Rebuilds the in-memory index from the whole log."""
+        if self._index_file is not None:
+            self._index_file.close()
+        self._index_file = open(self.index_path, "a")
+        self._index_inode = os.fstat(self._index_file.fileno()).st_ino
+        self._index_offset = 0
+        self._index_entries = 0
+        self._slots = OrderedDict()
+        self._row_keys = {}
+        self._remap()
+        self._replay()
+        self._free_rows = [row for row in range(self._capacity - 1, -1, -1) if row not in self._row_keys]
+
+    def _sync(self):
+        """Picks up rows and index entries written by other processes since the last call."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._index_inode:
+            self._reload()
+        elif stat.st_size > self._index_offset:
+            self._remap()
+            self._replay()
+
+    def _replay(self):
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a partial last line is left for later
+        self._index_offset += end
+        for line in data[:end].splitlines():
+            if line.startswith(b"{"):
+                continue
+            try:
+                key, row = line.decode("ascii").split()
+                row = int(row)
+            except ValueError:  # torn line from a writer that crashed mid-append
+                continue
+            if row < self._capacity:
+                self._assign(key, row)
+                self._index_entries += 1
+
+    def _append(self, lines: List[str]):
+        self._index_file.write("".join(lines))
+        self._index_file.flush()
+        self._index_offset = os.fstat(self._index_file.fileno()).st_size
+        self._index_entries += len(lines)
+        if self._index_entries > 2 * max(len(self._slots), 1024):
+            self._rewrite_index(list(self._slots.items()))
+
+    def _assign(self, key: str, row: int):
+        """Maps key -> row, dropping the key that held the row and the row that held the key."""
+        previous_key = self._row_keys.get(row)
+        if previous_key is not None and previous_key != key:
+            self._slots.pop(previous_key, None)
+        previous_row = self._slots.pop(key, None)
+        if previous_row is not None and previous_row != row:
+            self._row_keys.pop(previous_row, None)
+            self._free_rows.append(previous_row)
+        self._slots[key] = row
+        self._row_keys[row] = key
+
+    def _allocate_row(self) -> int:
+        while self._slots and len(self._slots) >= self.max_entries:
+            _, row = self._slots.popitem(last=False)
+            self._row_keys.pop(row, None)
+            self._free_rows.append(row)
+        while True:
+            while self._free_rows:
+                row = self._free_rows.pop()
+                if row not in self._row_keys:
+                    return row
+            self._grow(min(max(self._capacity * 2, 1024), self.max_entries))
+
+    def _grow(self, new_capacity: int):
+        """Extends the backing file (never shrinks it: other processes may map it) and re-maps it."""
+        size = new_capacity * self.dimension * 4
+        with open(self.vectors_path, "ab") as f:
+            if os.fstat(f.fileno()).st_size < size:
+                f.truncate(size)
+        self._remap()
+
+    def _remap(self):
+        """Maps the vector file at its current size; existing rows keep their positions."""
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        capacity = size // (self.dimension * 4)
+        if capacity == self._capacity and (self._vectors is not None or capacity == 0):
+            return
+        self._vectors = np.memmap(self.vectors_path, dtype="float32", mode="r+",
+                                  shape=(capacity, self.dimension)) if capacity else None
+        self._free_rows.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
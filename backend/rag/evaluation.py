@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from ..rag.embedder import RAGService
 from ..database.models.chunk import ChunkType
 from ..quiz.llm_service import llm
+from ..database.session import release_connection
+from fastapi.concurrency import run_in_threadpool
 
 class EvaluationService:
     def __init__(self, db: Session, rag_service: RAGService):
@@ -12,16 +14,37 @@ class EvaluationService:
 
 
 
-    def evaluate_answer(self, question_text: str, student_answer: str, ideal_answer: str, instructions: str = None):
+    def evaluate_answer(self, question_text: str, student_answer: str, ideal_answer: str, instructions: str = None, course_id: int = None):
         """
         Evaluates a student answer strictly as an Audit / Dialogue record.
         IMPORTANT: This does NOT vectorize or embed the student's answer into the knowledge base.
         """
+        prompt, chunk_ids = self._build_prompt(question_text, student_answer, ideal_answer, instructions, course_id)
+        response_text = self.llm.generate_content(prompt)
+        return self._parse_evaluation(response_text, chunk_ids)
+
+    async def evaluate_answer_async(self, question_text: str, student_answer: str, ideal_answer: str, instructions: str = None, course_id: int = None):
+        """
+        Async evaluate_answer: retrieval runs in the threadpool, the LLM call is awaited on the event loop
+        (after the DB transaction is ended, so no pooled connection is held while the model thinks).
+        """
+        def build_and_release():
+            prompt = self._build_prompt(question_text, student_answer, ideal_answer, instructions, course_id)
+            release_connection(self.db)
+            return prompt
+
+        prompt, chunk_ids = await run_in_threadpool(build_and_release)
+        response_text = await self.llm.generate_content_async(prompt)
+        return self._parse_evaluation(response_text, chunk_ids)
+
+    def _build_prompt(self, question_text: str, student_answer: str, ideal_answer: str, instructions: str = None, course_id: int = None):
+        """(evaluation prompt, ids of the retrieved reference chunks)."""
         # Retrieve relevant context ONLY (Student answer is used as a search query, not stored in FAISS)
         context_chunks = self.rag_service.retrieve(
             query=student_answer, 
             top_k=5, 
-            chunk_types=[ChunkType.SMALL, ChunkType.MEDIUM]
+            chunk_types=[ChunkType.SMALL, ChunkType.MEDIUM],
+            course_id=course_id
         )
         
         context_text = "\n\n".join([c.content for c in context_chunks])
@@ -43,9 +66,9 @@ class EvaluationService:
         2. Reasoning (Brief explanation of why this score was given)
         3. Any missing points from the syllabus.
         """
-        
-        response_text = self.llm.generate_content(prompt)
-        
+        return prompt, chunk_ids
+
+    def _parse_evaluation(self, response_text: str, chunk_ids):
         if "ERROR_RATE_LIMIT" in response_text:
             return {"score": 0.5, "reasoning": "AI Evaluation busy", "retrieved_chunk_ids": chunk_ids}
 
@@ -0,0 +1,470 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Tuple
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+load_dotenv()
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+
+def mmap_flags(kind: str) -> int:
+    """
+    Read-only, memory-mapped loading flags for an index type. IVF lists map with IO_FLAG_MMAP and flat/HNSW
+    codes with IO_FLAG_MMAP_IFC (newer FAISS); combining both makes FAISS reject IVF files.
+    """
+    if kind == "ivf":
+        return faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+class CourseIndexStore:
+    """
+    One FAISS index shard per course, stored under <root>/course_<id>/.
+    Shards are loaded lazily on first use, so a search only touches the queried course.
+    FAISS ids are `Chunk.id` primary keys.
+
+    Persistence is crash-safe: every save writes a new snapshot (index.v<N>.faiss) to a
+    temporary file, fsyncs it and renames it into place, then atomically replaces
+    manifest.json (version, vector count, sha256). Readers only load what the manifest
+    points to and verify its checksum. Saves take the course's writer lock.
+
+    Index types (FAISS_INDEX_TYPE):
+    - flat: exact IndexIDMap2(IndexFlatL2) scan.
+    - ivf:  IndexIVFFlat with native ids; trained automatically once a shard reaches
+            FAISS_ANN_MIN_VECTORS and retrained when it outgrows its nlist.
+    - hnsw: IndexIDMap2(IndexHNSWFlat); deletes rebuild the graph (HNSW cannot remove).
+    Shards below FAISS_ANN_MIN_VECTORS always stay flat.
+
+    With `mmap=True` the store is a read-only view: shards are memory-mapped (so every
+    worker process shares the OS page cache) and reloaded when the file on disk changes.
+    """
+
+    def __init__(self, dimension: int, root: str = None, index_type: str = None, mmap: bool = False):
+        self.dimension = dimension
+        self.mmap = mmap
+        self.root = root or os.getenv("FAISS_INDEX_DIR", "faiss_index")
+        self.index_type = (index_type or os.getenv("FAISS_INDEX_TYPE", "flat")).lower()
+        if self.index_type not in INDEX_TYPES:
+            print(f"[!] Unknown FAISS_INDEX_TYPE '{self.index_type}'. Falling back to flat.")
+            self.index_type = "flat"
+
+        # Training threshold and tunables
+        self.ann_min_vectors = int(os.getenv("FAISS_ANN_MIN_VECTORS", "10000"))
+        self.ivf_nlist = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = auto (~4 * sqrt(n))
+        self.ivf_nprobe = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+        self.hnsw_m = int(os.getenv("FAISS_HNSW_M", "32"))
+        self.hnsw_ef_construction = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+        self.hnsw_ef_search = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+        self._shards = {}
+        # Read-only stores: (mtime, size) of each loaded file, checked at most every FAISS_RELOAD_CHECK_SECONDS
+        self.reload_check_seconds = float(os.getenv("FAISS_RELOAD_CHECK_SECONDS", "2"))
+        self._signatures = {}
+        self._checked_at = {}
+        self.verify_checksums = os.getenv("FAISS_VERIFY_CHECKSUM", "1") != "0"
+        self._lock = threading.RLock()
+
+    def shard_dir(self, course_id: int) -> str:
+        return os.path.join(self.root, f"course_{course_id}")
+
+    def shard_path(self, course_id: int) -> str:
+        """Pre-snapshot location of a shard; still loaded when a course has no manifest yet."""
+        return os.path.join(self.shard_dir(course_id), "index.faiss")
+
+    def manifest_path(self, course_id: int) -> str:
+        return os.path.join(self.shard_dir(course_id), "manifest.json")
+
+    def writer_lock(self, course_id: int):
+        """Exclusive writer lock for one course shard (see `course_writer_lock`)."""
+        return course_writer_lock(course_id, self.root)
+
+    def get(self, course_id: int):
+        """Returns the course shard, loading it from disk (or creating it) on first access."""
+        with self._lock:
+            if course_id in self._shards and self.mmap:
+                self._reload_if_changed(course_id)
+            if course_id not in self._shards:
+                self._shards[course_id] = self._load(course_id)
+            return self._shards[course_id]
+
+    def notify_changed(self, course_id: int):
+        """Forces the next `get` of a read-only store to re-check the file on disk."""
+        self._checked_at.pop(course_id, None)
+
+    def add(self, course_id: int, ids: np.ndarray, vectors: np.ndarray):
+        """Adds vectors under the given ids, upgrading the shard to the configured ANN type when it grows."""
+        self._check_writable()
+        self.get(course_id).add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+        self._maybe_rebuild(course_id)
+
+    def remove(self, course_id: int, ids: np.ndarray) -> int:
+        """Removes vectors by id; returns how many were removed."""
+        self._check_writable()
+        ids = np.asarray(ids, dtype="int64")
+        index = self.get(course_id)
+        if self.kind(index) != "hnsw":
+            return index.remove_ids(ids)
+
+        # HNSW graphs do not support deletion: rebuild without the removed ids
+        all_ids, vectors = self.export(course_id)
+        keep = ~np.isin(all_ids, ids)
+        removed = int((~keep).sum())
+        if removed:
+            self._shards[course_id] = self.build(all_ids[keep], vectors[keep])
+        return removed
+
+    def export(self, course_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (ids, vectors) of every vector stored in a course shard."""
+        index = self.get(course_id)
+        if index.ntotal == 0:
+            return np.zeros(0, dtype="int64"), np.zeros((0, self.dimension), dtype="float32")
+
+        if self.kind(index) == "ivf":
+            # IVFFlat codes are the raw float32 vectors, stored per inverted list
+            invlists = index.invlists
+            ids, vectors = [], []
+            for list_no in range(index.nlist):
+                size = invlists.list_size(list_no)
+                if not size:
+                    continue
+                ids.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy())
+                codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * index.code_size)
+                vectors.append(np.frombuffer(codes, dtype="float32").reshape(size, self.dimension).copy())
+            return np.concatenate(ids), np.vstack(vectors)
+
+        return faiss.vector_to_array(index.id_map).astype("int64"), index.index.reconstruct_n(0, index.ntotal)
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray, index_type: str = None):
+        """Builds (and trains, if needed) a fresh index of the given type holding `vectors` under `ids`."""
+        kind = index_type or self._target_kind(len(ids))
+        if kind == "ivf":
+            nlist = self._nlist_for(len(ids))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(self.dimension), self.dimension, nlist)
+            index.train(np.ascontiguousarray(vectors, dtype="float32"))
+        elif kind == "hnsw":
+            inner = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m)
+            inner.hnsw.efConstruction = self.hnsw_ef_construction
+            index = faiss.IndexIDMap2(inner)
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+
+        self._apply_search_params(index)
+        if len(ids):
+            index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+        return index
+
+    def kind(self, index) -> str:
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf"
+        if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+            return "hnsw"
+        return "flat"
+
+    def save(self, course_id: int):
+        """Publishes the in-memory shard as a new versioned snapshot."""
+        self._check_writable()
+        if course_id not in self._shards:
+            return
+        with self.writer_lock(course_id):
+            self._write_snapshot(course_id, self._shards[course_id])
+
+    def reset(self, course_id: int):
+        """Empties a single course shard, publishing the empty index as a new snapshot."""
+        self._check_writable()
+        self._shards[course_id] = self._new_index()
+        self.save(course_id)
+
+    def reset_all(self):
+        """Empties every shard and removes the legacy single global index."""
+        self._check_writable()
+        for course_id in self.course_ids():
+            self.reset(course_id)
+        legacy_path = os.path.join(self.root, "index.faiss")
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def read_manifest(self, course_id: int) -> dict:
+        try:
+            with open(self.manifest_path(course_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def course_ids(self) -> List[int]:
+        """Courses with a shard in memory or on disk."""
+        ids = set(self._shards)
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.startswith("course_") and name[len("course_"):].isdigit():
+                    ids.add(int(name[len("course_"):]))
+        return sorted(ids)
+
+    def _check_writable(self):
+        if self.mmap:
+            raise RuntimeError("Memory-mapped index stores are read-only; use a writable CourseIndexStore for ingestion.")
+
+    def _write_snapshot(self, course_id: int, index):
+        """tmp file -> fsync -> rename, then the same for the manifest; keeps the previous snapshot for fallback."""
+        shard_dir = self.shard_dir(course_id)
+        os.makedirs(shard_dir, exist_ok=True)
+        previous = self.read_manifest(course_id)
+        version = (previous["version"] if previous else 0) + 1
+        filename = f"index.v{version}.faiss"
+
+        data = faiss.serialize_index(index)
+        _write_durably(os.path.join(shard_dir, filename), data.tobytes())
+        manifest = {
+            "version": version,
+            "file": filename,
+            "ntotal": int(index.ntotal),
+            "dimension": self.dimension,
+            "index_type": self.kind(index),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "created_at": datetime.utcnow().isoformat(),
+            "previous": {k: previous.get(k) for k in ("version", "file", "ntotal", "sha256", "index_type")} if previous else None,
+        }
+        _write_durably(self.manifest_path(course_id), json.dumps(manifest, indent=2).encode("utf-8"))
+
+        # Prune snapshots older than the previous one; mapped readers keep their inode alive
+        keep = {filename, previous["file"] if previous else None}
+        for name in os.listdir(shard_dir):
+            if name.startswith("index.") and name.endswith(".faiss") and name not in keep:
+                os.remove(os.path.join(shard_dir, name))
+
+        if _shared_store and _shared_store.root == self.root:
+            _shared_store.notify_changed(course_id)
+        print(f"    -> FAISS snapshot v{version} published for course {course_id} ({index.ntotal} vectors)")
+
+    def _signature(self, course_id: int):
+        """The published manifest version (or legacy file stat) a reader compares against."""
+        manifest = self.read_manifest(course_id)
+        if manifest:
+            return manifest["version"]
+        try:
+            stat = os.stat(self.shard_path(course_id))
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _reload_if_changed(self, course_id: int):
+        now = time.monotonic()
+        if now - self._checked_at.get(course_id, 0) < self.reload_check_seconds:
+            return
+        self._checked_at[course_id] = now
+        if self._signature(course_id) != self._signatures.get(course_id):
+            print(f"[*] FAISS shard for course {course_id} changed on disk. Reloading...")
+            del self._shards[course_id]
+
+    def _load(self, course_id: int):
+        if self.mmap:
+            self._signatures[course_id] = self._signature(course_id)
+            self._checked_at[course_id] = time.monotonic()
+
+        manifest = self.read_manifest(course_id)
+        if manifest:
+            # Current snapshot first, then the previous one if the current fails verification
+            candidates = [manifest] + ([manifest["previous"]] if manifest.get("previous") else [])
+        elif os.path.exists(self.shard_path(course_id)):
+            candidates = [{"file": "index.faiss", "sha256": None, "ntotal": None}]
+        else:
+            candidates = []
+
+        unreadable = []
+        for snapshot in candidates:
+            path = os.path.join(self.shard_dir(course_id), snapshot["file"])
+            if not os.path.exists(path):
+                print(f"[!] FAISS snapshot {snapshot['file']} for course {course_id} is missing.")
+                continue
+            try:
+                if snapshot["sha256"] and self.verify_checksums and _file_sha256(path) != snapshot["sha256"]:
+                    print(f"[!] FAISS snapshot {snapshot['file']} for course {course_id} failed checksum verification.")
+                    continue
+                index = self._read_index(path, snapshot.get("index_type"))
+                if index.d != self.dimension:
+                    print(f"[!] FAISS Dimension Mismatch for course {course_id} ({index.d} vs {self.dimension}). Re-initializing shard.")
+                elif not isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF)):
+                    print(f"[!] FAISS shard for course {course_id} is not keyed by chunk id. Re-initializing shard (run scripts/reindex_rag.py).")
+                elif snapshot["ntotal"] is not None and index.ntotal != snapshot["ntotal"]:
+                    print(f"[!] FAISS snapshot {snapshot['file']} for course {course_id} holds {index.ntotal} vectors, manifest says {snapshot['ntotal']}.")
+                    continue
+                else:
+                    self._apply_search_params(index)
+                    return index
+                break
+            except Exception as e:
+                print(f"[!] Could not read FAISS snapshot {snapshot['file']} for course {course_id}: {e}.")
+                unreadable.append(snapshot["file"])
+        if unreadable:
+            # Serving an empty shard here would make every search silently return nothing
+            raise RuntimeError(f"No readable FAISS snapshot for course {course_id} ({', '.join(unreadable)})")
+        return self._new_index()
+
+    def _read_index(self, path: str, kind: str = None):
+        """Reads a snapshot, memory-mapped for read-only stores; falls back to a plain read if mapping fails."""
+        if not self.mmap:
+            return faiss.read_index(path)
+        # The kind is known from the manifest for current snapshots; otherwise try each flag set
+        flag_sets = [mmap_flags(kind)] if kind else [mmap_flags("flat"), mmap_flags("ivf")]
+        error = None
+        for flags in flag_sets:
+            try:
+                return faiss.read_index(path, flags)
+            except RuntimeError as e:
+                error = e
+        print(f"[!] Could not memory-map {os.path.basename(path)} ({str(error).strip().splitlines()[-1]}). Reading it into memory.")
+        return faiss.read_index(path)
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+
+    def _target_kind(self, count: int) -> str:
+        return self.index_type if count >= self.ann_min_vectors else "flat"
+
+    def _nlist_for(self, count: int) -> int:
+        nlist = self.ivf_nlist or int(4 * math.sqrt(count))
+        # FAISS wants ~39 training points per centroid
+        return max(1, min(nlist, count // 39))
+
+    def _maybe_rebuild(self, course_id: int):
+        """Retrains the shard when it crosses the ANN threshold or an IVF shard outgrows its nlist."""
+        index = self._shards[course_id]
+        current, target = self.kind(index), self._target_kind(index.ntotal)
+        outgrown = current == "ivf" and not self.ivf_nlist and self._nlist_for(index.ntotal) >= 4 * index.nlist
+        if current == target and not outgrown:
+            return
+        if current != "flat" and target == "flat":
+            return  # never downgrade a trained shard because of deletions
+
+        print(f"[*] Rebuilding FAISS shard for course {course_id} as {target.upper()} ({index.ntotal} vectors)...")
+        ids, vectors = self.export(course_id)
+        self._shards[course_id] = self.build(ids, vectors, target)
+
+    def _apply_search_params(self, index):
+        kind = self.kind(index)
+        if kind == "ivf":
+            index.nprobe = self.ivf_nprobe
+        elif kind == "hnsw":
+            faiss.downcast_index(index.index).hnsw.efSearch = self.hnsw_ef_search
+
+
+def _write_durably(path: str, data: bytes):
+    """Writes to a temporary sibling, fsyncs it, renames it over `path` and fsyncs the directory."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- Writer locks ---
+
+_writer_locks = {}  # lock path -> [threading.RLock, open lock file, depth]
+_writer_locks_guard = threading.Lock()
+
+
+class CourseLocked(Exception):
+    """Raised by `course_writer_lock(..., wait=False)` when another writer holds the course."""
+
+
+@contextmanager
+def course_writer_lock(course_id: int, root: str = None, wait: bool = True):
+    """
+    Re-entrant, cross-process exclusive lock for writing one course shard.
+    Threads of this process queue on an RLock; other processes block on flock().
+    With wait=False, raises CourseLocked instead of waiting for another writer.
+    """
+    root = root or os.getenv("FAISS_INDEX_DIR", "faiss_index")
+    lock_dir = os.path.join(root, f"course_{course_id}")
+    path = os.path.join(lock_dir, ".write.lock")
+    with _writer_locks_guard:
+        entry = _writer_locks.setdefault(path, [threading.RLock(), None, 0])
+
+    if not entry[0].acquire(blocking=wait):
+        raise CourseLocked(f"Course {course_id} is being written by another thread")
+    try:
+        if entry[2] == 0:
+            os.makedirs(lock_dir, exist_ok=True)
+            entry[1] = open(path, "a")
+            if fcntl:
+                try:
+                    fcntl.flock(entry[1].fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if not wait:
+                        entry[1].close()
+                        entry[1] = None
+                        raise CourseLocked(f"Course {course_id} is being written by another process")
+                    print(f"[*] Waiting for another ingestion to finish writing course {course_id}...")
+                    fcntl.flock(entry[1].fileno(), fcntl.LOCK_EX)
+        entry[2] += 1
+        try:
+            yield
+        finally:
+            entry[2] -= 1
+            if entry[2] == 0:
+                if fcntl:
+                    fcntl.flock(entry[1].fileno(), fcntl.LOCK_UN)
+                entry[1].close()
+                entry[1] = None
+    finally:
+        entry[0].release()
+
+
+# --- Process-wide registry ---
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_store(dimension: int = 1024) -> CourseIndexStore:
+    """The process-wide, read-only (memory-mapped) store used to serve queries."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = CourseIndexStore(dimension, mmap=True)
+        return _shared_store
+
+
+def init_index_registry(dimension: int = 1024) -> CourseIndexStore:
+    """Opens every course shard once at startup so requests never read an index from disk."""
+    store = get_shared_store(dimension)
+    course_ids = store.course_ids()
+    failed = 0
+    for course_id in course_ids:
+        # One unreadable shard must not keep the API from starting; its searches are skipped until it is fixed
+        try:
+            store.get(course_id)
+        except Exception as e:
+            failed += 1
+            print(f"[!] FAISS shard for course {course_id} unavailable: {e}")
+    print(f"[*] FAISS index registry ready: {len(course_ids) - failed} course shards memory-mapped from {store.root}"
+          + (f" ({failed} unreadable)" if failed else ""))
+    return store
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache (with TTL) for query embeddings,
+    keyed on (model name, whitespace-normalized query text).
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, vector), least recently used first
+        self._lock = threading.Lock()
+
+    def _key(self, model_name: str, query: str):
+        return model_name, " ".join((query or "").split())
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        key = self._key(model_name, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, model_name: str, query: str, vector: np.ndarray):
+        key = self._key(model_name, query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Global instance: shared by every Embedder in the process
+query_cache = QueryEmbeddingCache()
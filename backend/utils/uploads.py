@@ -0,0 +1,179 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Tuple
+from dotenv import load_dotenv
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+load_dotenv()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+UPLOAD_BLOCK_BYTES = int(os.getenv("UPLOAD_BLOCK_BYTES", str(1024 * 1024)))
+# Room for multipart framing and small form fields on top of the file itself
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadWriter:
+    """
+    Writes an upload to a temp file in the upload directory, hashing it and enforcing `max_bytes` on every
+    block; `commit` stores it content-addressed as <upload_dir>/<sha256><suffix> (atomic rename), so
+    identical uploads share one file and different files never overwrite each other.
+    """
+
+    def __init__(self, suffix: str = ".pdf", upload_dir: str = None, max_bytes: int = None):
+        self.suffix = suffix
+        self.upload_dir = upload_dir or UPLOAD_DIR
+        self.max_bytes = max_bytes or MAX_UPLOAD_BYTES
+        self.size = 0
+        self._digest = hashlib.sha256()
+        os.makedirs(self.upload_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        self._out = os.fdopen(fd, "wb")
+
+    def write(self, block: bytes):
+        self.size += len(block)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        self._digest.update(block)
+        self._out.write(block)
+
+    def commit(self) -> Tuple[str, str, int]:
+        """Returns (path, sha256, size)."""
+        self._out.close()
+        sha256 = self._digest.hexdigest()
+        path = os.path.join(self.upload_dir, f"{sha256}{self.suffix}")
+        os.replace(self._tmp_path, path)
+        return path, sha256, self.size
+
+    def discard(self):
+        self._out.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def save_upload(source: BinaryIO, suffix: str = ".pdf", upload_dir: str = None, max_bytes: int = None) -> Tuple[str, str, int]:
+    """
+    Copies a (blocking) binary stream to disk in UPLOAD_BLOCK_BYTES blocks (see UploadWriter).
+    Returns (path, sha256, size); raises UploadTooLarge past max_bytes.
+    Blocking: call it from a worker thread (e.g. run_in_threadpool), not on the event loop.
+    """
+    writer = UploadWriter(suffix, upload_dir, max_bytes)
+    try:
+        for block in iter(lambda: source.read(UPLOAD_BLOCK_BYTES), b""):
+            writer.write(block)
+        return writer.commit()
+    except BaseException:
+        writer.discard()
+        raise
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file on disk, read in UPLOAD_BLOCK_BYTES blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def receive_upload(request, field: str = "file", suffix: str = ".pdf", upload_dir: str = None,
+                         max_bytes: int = None) -> Tuple[str, str, int, str]:
+    """
+    Streams the `field` file of a multipart/form-data request straight from `request.stream()` to disk,
+    parsing the body as it arrives: nothing is spooled first, and the limit is enforced on every chunk
+    whether or not the client sent a Content-Length. Parsing and disk writes run in the threadpool.
+    Returns (path, sha256, size, filename); raises UploadTooLarge, or ValueError for a bad form.
+    """
+    from fastapi.concurrency import run_in_threadpool
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise ValueError("Expected a multipart/form-data upload")
+
+    writer = UploadWriter(suffix, upload_dir, max_bytes)
+    receiver = _FilePart(field, writer)
+    parser = multipart.MultipartParser(options[b"boundary"], receiver.callbacks())
+    received, pending, pending_bytes = 0, [], 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > writer.max_bytes + FORM_OVERHEAD_BYTES:
+                raise UploadTooLarge(f"Upload exceeds the {writer.max_bytes // (1024 * 1024)} MB limit")
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= UPLOAD_BLOCK_BYTES:
+                await run_in_threadpool(parser.write, b"".join(pending))
+                pending, pending_bytes = [], 0
+        if pending:
+            await run_in_threadpool(parser.write, b"".join(pending))
+        parser.finalize()
+        if receiver.filename is None:
+            raise ValueError(f"No '{field}' file in the upload")
+        path, sha256, size = await run_in_threadpool(writer.commit)
+        return path, sha256, size, receiver.filename
+    except multipart.exceptions.MultipartParseError as e:
+        writer.discard()
+        raise ValueError(f"Malformed multipart upload: {e}")
+    except BaseException:
+        writer.discard()
+        raise
+
+
+class _FilePart:
+    """python-multipart callbacks routing the bytes of one file field into an UploadWriter."""
+
+    def __init__(self, field: str, writer: UploadWriter):
+        self.field = field.encode()
+        self.writer = writer
+        self.filename = None
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._active = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": lambda data, start, end: self._append("_header_field", data[start:end]),
+            "on_header_value": lambda data, start, end: self._append("_header_value", data[start:end]),
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _append(self, name: str, data: bytes):
+        setattr(self, name, getattr(self, name) + data)
+
+    def _part_begin(self):
+        self._disposition = b""
+
+    def _header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _headers_finished(self):
+        _, params = parse_options_header(self._disposition)
+        # Only the first file under `field` is stored; other fields are skipped
+        self._active = self.filename is None and params.get(b"name") == self.field and b"filename" in params
+        if self._active:
+            self.filename = params[b"filename"].decode("utf-8", "replace")
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._active:
+            self.writer.write(data[start:end])
+
+    def _part_end(self):
+        self._active = False
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.rag.index_store import CourseIndexStore, INDEX_TYPES
+
+
+def make_corpus(size: int, dimension: int, clusters: int, seed: int = 0):
+    """Clustered, L2-normalised synthetic vectors (closer to real embeddings than uniform noise)."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension)).astype('float32')
+    labels = rng.integers(0, clusters, size)
+    vectors = centroids[labels] + 0.6 * rng.standard_normal((size, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def benchmark_ann(size: int, queries: int, k: int, index_types, dimension: int = 1024):
+    print(f"[*] Building synthetic corpus: {size} x {dimension} ({queries} queries, k={k})")
+    corpus = make_corpus(size + queries, dimension, clusters=max(8, size // 500))
+    vectors, query_vectors = corpus[:size], corpus[size:]
+    ids = np.arange(1, size + 1, dtype='int64')
+
+    # Force ANN types regardless of corpus size so every type is measured
+    store = CourseIndexStore(dimension, root=os.devnull)
+    store.ann_min_vectors = 0
+
+    ground_truth = None
+    rows = []
+    for index_type in ["flat"] + [t for t in index_types if t != "flat"]:
+        start = time.time()
+        index = store.build(ids, vectors, index_type)
+        build_seconds = time.time() - start
+
+        latencies = []
+        results = np.zeros((queries, k), dtype='int64')
+        for i in range(queries):
+            q_start = time.perf_counter()
+            _, found = index.search(query_vectors[i:i + 1], k)
+            latencies.append((time.perf_counter() - q_start) * 1000)
+            results[i] = found[0]
+
+        if ground_truth is None:
+            ground_truth = results
+        recall = np.mean([len(set(results[i]) & set(ground_truth[i])) / k for i in range(queries)])
+        rows.append((index_type, build_seconds, recall, np.percentile(latencies, 50), np.percentile(latencies, 99)))
+
+    print(f"\n{'TYPE':<6} {'BUILD (s)':>10} {f'RECALL@{k}':>10} {'P50 (ms)':>10} {'P99 (ms)':>10}")
+    for index_type, build_seconds, recall, p50, p99 in rows:
+        print(f"{index_type:<6} {build_seconds:>10.2f} {recall:>10.3f} {p50:>10.3f} {p99:>10.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark of FAISS index types against exact search.")
+    parser.add_argument("--size", type=int, default=50000, help="Number of corpus vectors")
+    parser.add_argument("--queries", type=int, default=500, help="Number of single-vector queries")
+    parser.add_argument("-k", type=int, default=5, help="Neighbours per query (recall@k)")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--dimension", type=int, default=1024)
+    args = parser.parse_args()
+    benchmark_ann(args.size, args.queries, args.k, args.types, args.dimension)
@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Offline, uncached embeddings and a throwaway FAISS directory: only persistence cost should differ
+os.environ["EMBEDDING_BACKEND"] = "stub"
+os.environ["EMBED_CACHE"] = "0"
+os.environ.setdefault("FAISS_INDEX_DIR", tempfile.mkdtemp(prefix="bench_faiss_"))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from backend.database.models.base import Base
+from backend.database.models.user import User
+from backend.database.models.course import Course
+from backend.database.models.hierarchy import Chapter, Section, Subsection, RawMaterial
+from backend.database.models.chunk import Chunk, KnowledgeRelation
+from backend.database.models.question import Question
+from backend.database.models.transcript import Quiz, Transcript
+from backend.ingestion.processor import MaterialProcessor
+
+
+def make_hierarchy(chapters: int, subsections: int, paragraphs: int):
+    """Synthetic extraction output shaped like MaterialProcessor._extract_structure."""
+    data = []
+    for c in range(1, chapters + 1):
+        data.append({
+            "title": f"Chapter {c}",
+            "order": c,
+            "sections": [{
+                "title": f"Section {c}.1",
+                "order": 1,
+                "subsections": [{
+                    "title": f"Content Block {c}.1.{s}",
+                    "order": s,
+                    "content": "\n\n".join(
+                        f"Paragraph {c}.{s}.{p} covers topic number {c * p + s} in enough words to be a real paragraph."
+                        for p in range(paragraphs)
+                    ),
+                } for s in range(1, subsections + 1)],
+            }],
+        })
+    return data
+
+
+def run(bulk: bool, hierarchy, database_url: str, with_relations: bool):
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    course = Course(title="Benchmark")
+    db.add(course)
+    db.commit()
+
+    processor = MaterialProcessor(db, bulk_insert=bulk)
+    if not with_relations:
+        # Relation building is identical in both paths; leave it out to isolate persistence
+        processor._create_deterministic_relations = lambda *args, **kwargs: None
+
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor._store_hierarchy(course.id, hierarchy)
+    seconds = time.time() - start
+
+    rows = sum(db.query(func.count(model.id)).scalar() for model in (Chapter, Section, Subsection, RawMaterial, Chunk))
+    db.close()
+    engine.dispose()
+    return rows, seconds
+
+
+def benchmark_bulk_insert(chapters: int, subsections: int, paragraphs: int, database_url: str = None, with_relations: bool = False):
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_db_'), 'bench.db')}"
+    hierarchy = make_hierarchy(chapters, subsections, paragraphs)
+    print(f"[*] {chapters} chapters x {subsections} subsections x {paragraphs} paragraphs on {database_url.split('://')[0]}")
+
+    results = {}
+    for label, bulk in (("row-wise", False), ("bulk", True)):
+        rows, seconds = run(bulk, hierarchy, database_url, with_relations)
+        results[label] = (rows, seconds)
+
+    print(f"\n{'PATH':<10} {'ROWS':>8} {'SECONDS':>10} {'ROWS/S':>10}")
+    for label, (rows, seconds) in results.items():
+        print(f"{label:<10} {rows:>8} {seconds:>10.2f} {rows / seconds:>10.0f}")
+    print(f"\nSpeedup: {results['row-wise'][1] / results['bulk'][1]:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rows/s of bulk-insert vs row-wise hierarchy persistence.")
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--subsections", type=int, default=4, help="Subsections per chapter")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per subsection")
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file (tables are dropped!)")
+    parser.add_argument("--with-relations", action="store_true", help="Include keyword relation building")
+    args = parser.parse_args()
+    benchmark_bulk_insert(args.chapters, args.subsections, args.paragraphs, args.database_url, args.with_relations)
@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Offline, uncached embeddings: the benchmark measures the pipeline, not the embedding API
+os.environ["EMBEDDING_BACKEND"] = "stub"
+os.environ["EMBED_CACHE"] = "0"
+
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Course, Chapter, Section, Subsection, RawMaterial, Chunk, ChunkType
+from backend.database.models.chunk import KnowledgeRelation
+from backend.ingestion.chunking import Chunker
+from backend.ingestion.extraction import peak_rss_mb
+from backend.ingestion.processor import MaterialProcessor
+from backend.rag.embedder import Embedder
+
+# Stage -> methods whose (exclusive) wall time is charged to it
+STAGES = {
+    "extraction": [(MaterialProcessor, "_extract_structure")],
+    "hierarchy_storage": [(MaterialProcessor, "_store_hierarchy"), (MaterialProcessor, "_sync_hierarchy"),
+                          (MaterialProcessor, "clear_course_data")],
+    "chunking": [(Chunker, "build_spans"), (Chunker, "generate_chunks")],
+    "embedding": [(Embedder, "embed_texts"), (Embedder, "add"), (Embedder, "upsert"), (Embedder, "_save_index")],
+    "relation_building": [(MaterialProcessor, "_build_relations")],
+}
+
+# Pipeline knobs recorded with every result so runs stay comparable over time
+CONFIG_ENV = [
+    "INGESTION_BULK_INSERT", "INGESTION_INCREMENTAL", "EXTRACTION_OUTLINE", "EXTRACTION_MAX_BLOCK_CHARS",
+    "EXTRACTION_WORKERS", "CHUNKER_MODE", "CHUNK_MERGE", "CHUNK_STORAGE", "RELATION_BUILDER",
+    "EMBED_BATCH_SIZE", "FAISS_INDEX_TYPE",
+]
+
+VOCABULARY = (
+    "state power knowledge society market institution theory practice evidence method system structure "
+    "process analysis history policy network capital labour culture language identity authority order"
+).split()
+CONCEPTS = ["Legibility", "Foucault", "Weber", "Bureaucracy", "Panopticon", "Hegemony", "Sovereignty", "Modernity"]
+
+
+class StageTimer:
+    """
+    Charges wall time to pipeline stages by wrapping methods. Time is exclusive: when a timed method
+    calls another timed method (e.g. hierarchy storage -> chunking -> embedding), the inner time is
+    only charged to the inner stage.
+    """
+
+    def __init__(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+        self._stack = []
+        self._originals = []
+
+    def install(self):
+        for stage, targets in STAGES.items():
+            for owner, name in targets:
+                original = getattr(owner, name)
+                self._originals.append((owner, name, original))
+                setattr(owner, name, self._wrap(stage, original))
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def _wrap(self, stage, original):
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            self._stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self._stack.pop()
+                self.seconds[stage] += elapsed - nested
+                self.calls[stage] += 1
+                if self._stack:
+                    self._stack[-1] += elapsed
+        return timed
+
+
+def make_pdf(path: str, pages: int, paragraphs: int, words: int = 40, pages_per_chapter: int = 5,
+             headings: bool = True, seed: int = 0) -> int:
+    """
+    Synthetic course PDF: `paragraphs` paragraphs of about `words` words per page, with concept names
+    sprinkled in so keyword relations have something to find. With `headings`, every chapter starts
+    with a large-font title, every page with a section title, and both go into the PDF outline.
+    Returns the file size in bytes.
+    """
+    import fitz  # PyMuPDF
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    toc = []
+    for page_number in range(pages):
+        page = doc.new_page()
+        chapter, section = page_number // pages_per_chapter + 1, page_number % pages_per_chapter + 1
+        top = 50
+        if headings:
+            if section == 1:
+                title = f"Chapter {chapter}: {CONCEPTS[chapter % len(CONCEPTS)]} and the {VOCABULARY[chapter % len(VOCABULARY)].title()}"
+                page.insert_text((50, top + 16), title, fontsize=16)
+                toc.append([1, title, page_number + 1])
+                top += 28
+            title = f"{chapter}.{section} {VOCABULARY[(chapter * 7 + section) % len(VOCABULARY)].title()} in Practice"
+            page.insert_text((50, top + 12), title, fontsize=12)
+            toc.append([2, title, page_number + 1])
+            top += 22
+
+        body = []
+        for _ in range(paragraphs):
+            tokens = list(rng.choice(VOCABULARY, size=words))
+            for position in rng.choice(words, size=max(1, words // 15), replace=False):
+                tokens[position] = CONCEPTS[rng.integers(len(CONCEPTS))]
+            body.append(" ".join(tokens).capitalize() + ".")
+        if page.insert_textbox(fitz.Rect(50, top, 545, 800), "\n\n".join(body), fontsize=8) < 0:
+            raise ValueError(f"{paragraphs} paragraphs of {words} words do not fit on a page; lower --paragraphs or --words")
+
+    if headings:
+        doc.set_toc(toc)
+    doc.save(path)
+    doc.close()
+    return os.path.getsize(path)
+
+
+def count_rows(db, store, course_id: int):
+    rows = {model.__tablename__: db.query(func.count(model.id)).scalar()
+            for model in (Chapter, Section, Subsection, RawMaterial, Chunk, KnowledgeRelation)}
+    for chunk_type in ChunkType:
+        rows[f"chunks_{chunk_type.value}"] = db.query(func.count(Chunk.id)).filter(Chunk.chunk_type == chunk_type).scalar()
+    rows["vectors"] = int(store.get(course_id).ntotal)
+    return rows
+
+
+def run_once(pdf_path: str, work_dir: str, trace_memory: bool, verbose: bool):
+    """Ingests one PDF into a fresh SQLite database and FAISS directory; returns the measurements."""
+    os.environ["FAISS_INDEX_DIR"] = os.path.join(work_dir, "faiss_index")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    course = Course(title="Benchmark")
+    db.add(course)
+    db.commit()
+
+    timer = StageTimer()
+    timer.install()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            try:
+                succeeded, error = MaterialProcessor(db).process_material(course.id, pdf_path, "pdf"), None
+            except Exception as e:
+                succeeded, error = False, str(e)
+        total = time.perf_counter() - start
+        peak_python_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        timer.uninstall()
+
+    stages = {stage: round(seconds, 4) for stage, seconds in timer.seconds.items()}
+    stages["other"] = round(max(0.0, total - sum(timer.seconds.values())), 4)
+    result = {
+        "succeeded": succeeded,
+        "error": error,
+        "total_seconds": round(total, 4),
+        "stages": stages,
+        "stage_calls": timer.calls,
+        "rows": count_rows(db, Embedder(db).store, course.id),
+        "peak_python_mb": round(peak_python_mb, 1) if peak_python_mb is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    db.close()
+    engine.dispose()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def benchmark_ingestion(page_counts, paragraphs: int, words: int, headings: bool, repeat: int = 1,
+                        trace_memory: bool = True, verbose: bool = False, keep: bool = False):
+    """Runs every page count `repeat` times; each run's PDF, database and index go in a temp dir removed after it (unless `keep`)."""
+    runs = []
+    for pages in page_counts:
+        for attempt in range(1, repeat + 1):
+            work_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+            try:
+                pdf_path = os.path.join(work_dir, f"synthetic_{pages}p.pdf")
+                pdf_bytes = make_pdf(pdf_path, pages, paragraphs, words, headings=headings, seed=pages)
+                print(f"[*] {pages} pages x {paragraphs} paragraphs ({pdf_bytes / 1024:.0f} KB), run {attempt}/{repeat}...", file=sys.stderr)
+                result = run_once(pdf_path, work_dir, trace_memory, verbose)
+            finally:
+                if keep:
+                    print(f"    -> Kept {work_dir}", file=sys.stderr)
+                else:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            runs.append({"pages": pages, "paragraphs_per_page": paragraphs, "words_per_paragraph": words,
+                         "headings": headings, "run": attempt, "pdf_bytes": pdf_bytes, **result})
+            if not result["succeeded"]:
+                print(f"[!] Ingestion failed for {pages} pages: {result['error']} (rerun with --verbose for the pipeline log)",
+                      file=sys.stderr)
+
+    return {
+        "benchmark": "ingestion",
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {name: os.getenv(name) for name in CONFIG_ENV if os.getenv(name) is not None},
+        "tracemalloc": trace_memory,
+        "runs": runs,
+    }
+
+
+def print_summary(report):
+    labels = {"extraction": "EXTRACT", "hierarchy_storage": "HIERARCHY", "chunking": "CHUNK", "embedding": "EMBED",
+              "relation_building": "RELATIONS", "other": "OTHER"}
+    memory = "HEAP MB" if report["tracemalloc"] else "RSS MB"
+    print(f"\n{'PAGES':>6} {'TOTAL':>8} " + " ".join(f"{label:>9}" for label in labels.values())
+          + f" {'CHUNKS':>7} {'VECTORS':>8} {'RELS':>7} {memory:>8}")
+    for run in report["runs"]:
+        peak = run["peak_python_mb"] if report["tracemalloc"] else run["peak_rss_mb"]
+        print(f"{run['pages']:>6} {run['total_seconds']:>8.2f} " + " ".join(f"{run['stages'][stage]:>9.2f}" for stage in labels)
+              + f" {run['rows']['chunks']:>7} {run['rows']['vectors']:>8} {run['rows']['knowledge_relations']:>7} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end ingestion benchmark (per-stage time, rows, memory) on synthetic PDFs.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 100], help="Page counts to benchmark")
+    parser.add_argument("--paragraphs", type=int, default=8, help="Paragraphs per page")
+    parser.add_argument("--words", type=int, default=40, help="Words per paragraph")
+    parser.add_argument("--no-headings", action="store_true", help="No outline/headings (page-group fallback)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per page count")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="Skip Python heap tracing (faster; peak memory is then process RSS only)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file ('-' for stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Show the ingestion pipeline log")
+    parser.add_argument("--keep", action="store_true", help="Keep each run's temp dir (PDF, database, FAISS index)")
+    args = parser.parse_args()
+
+    report = benchmark_ingestion(args.pages, args.paragraphs, args.words, not args.no_headings, args.repeat,
+                                 not args.no_tracemalloc, args.verbose, args.keep)
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print_summary(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n[*] JSON report written to {args.output}")
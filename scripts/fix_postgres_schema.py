@@ -69,6 +69,49 @@ def fix_postgres_schema():
             FOREIGN KEY (question_id) REFERENCES questions(id) ON DELETE CASCADE;
         """))
         
+        # 7. Content hashes for incremental re-ingestion
+        print("Adding subsections(content_hash)...")
+        conn.execute(text("""
+            ALTER TABLE subsections ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+            CREATE INDEX IF NOT EXISTS ix_subsections_content_hash ON subsections (content_hash);
+        """))
+        
+        # 8. Similarity weights for kNN knowledge relations
+        print("Adding knowledge_relations(weight)...")
+        conn.execute(text("""
+            ALTER TABLE knowledge_relations ADD COLUMN IF NOT EXISTS weight DOUBLE PRECISION;
+        """))
+        
+        # 9. Source document hashes (duplicate-upload short-circuit)
+        print("Adding courses(source_hash)...")
+        conn.execute(text("""
+            ALTER TABLE courses ADD COLUMN IF NOT EXISTS source_hash VARCHAR(64);
+            CREATE INDEX IF NOT EXISTS ix_courses_source_hash ON courses (source_hash);
+        """))
+        
+        # 10. Span-based chunks (offsets into raw_materials instead of copied text)
+        print("Adding chunks(raw_material_id, start_offset, end_offset)...")
+        conn.execute(text("""
+            ALTER TABLE chunks ALTER COLUMN content DROP NOT NULL;
+            ALTER TABLE chunks ADD COLUMN IF NOT EXISTS raw_material_id INTEGER
+                REFERENCES raw_materials(id) ON DELETE CASCADE;
+            ALTER TABLE chunks ADD COLUMN IF NOT EXISTS start_offset INTEGER;
+            ALTER TABLE chunks ADD COLUMN IF NOT EXISTS end_offset INTEGER;
+            CREATE INDEX IF NOT EXISTS ix_chunks_raw_material_id ON chunks (raw_material_id);
+        """))
+        
+        # 11. Worker heartbeats (stale-job detection for long ingestions)
+        print("Adding ingestion_jobs(heartbeat_at)...")
+        conn.execute(text("""
+            ALTER TABLE IF EXISTS ingestion_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE;
+        """))
+        
+        # 12. Upload hashes carried by jobs (the worker does not re-read the file to hash it)
+        print("Adding ingestion_jobs(source_hash)...")
+        conn.execute(text("""
+            ALTER TABLE IF EXISTS ingestion_jobs ADD COLUMN IF NOT EXISTS source_hash VARCHAR(64);
+        """))
+        
         conn.commit()
         print("Successfully applied Foreign Key Cascades!")
 
@@ -1,6 +1,5 @@
 import os
 import sys
-import numpy as np
 from sqlalchemy.orm import Session
 
 # Add project root to path
@@ -8,6 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.database.session import SessionLocal
 from backend.database.models.chunk import Chunk, ChunkType
+from backend.database.models.hierarchy import Chapter, Section, Subsection
 from backend.rag.embedder import Embedder
 
 def reindex_all_chunks():
@@ -16,54 +16,33 @@ def reindex_all_chunks():
         print("[*] Starting Re-indexing Process...")
         embedder = Embedder(db)
         
-        # Reset FAISS index
+        # Reset every FAISS shard (also removes the legacy global index)
         embedder.reset_index()
         
-        # Fetch all SMALL and MEDIUM chunks
-        chunks = db.query(Chunk).filter(
+        # Fetch all SMALL and MEDIUM chunks together with their course
+        rows = db.query(Chunk, Chapter.course_id).join(Subsection).join(Section).join(Chapter).filter(
             Chunk.chunk_type.in_([ChunkType.SMALL, ChunkType.MEDIUM])
         ).order_by(Chunk.id).all()
         
-        if not chunks:
+        if not rows:
             print("[!] No chunks found in database.")
             return
 
-        print(f"[*] Found {len(chunks)} chunks to re-index.")
+        print(f"[*] Found {len(rows)} chunks to re-index.")
         
-        # Process in batches to avoid API timeouts
-        batch_size = 30
-        all_embeddings = []
+        by_course = {}
+        for chunk, course_id in rows:
+            by_course.setdefault(course_id, []).append(chunk)
         
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            texts = [c.content for c in batch]
-            print(f"[*] Processing batch {i//batch_size + 1} ({len(batch)} chunks)...")
-            
-            batch_embeddings = []
-            for text in texts:
-                try:
-                    emb = embedder.client.feature_extraction(text)
-                    batch_embeddings.append(emb)
-                except Exception as e:
-                    print(f"[!] Embedding Error: {e}")
-                    batch_embeddings.append([0.0] * embedder.dimension)
-            
-            all_embeddings.extend(batch_embeddings)
-            
-        embeddings_np = np.array(all_embeddings).astype('float32')
+        # Batched, concurrent embedding (see EMBED_BATCH_SIZE / EMBED_MAX_CONCURRENCY), one shard per course
+        for course_id, chunks in by_course.items():
+            with embedder.store.writer_lock(course_id):
+                embedder.index_chunks(chunks, course_id)
+                embedder._save_index(course_id)
+            print(f"[+] Course {course_id}: shard contains {embedder.store.get(course_id).ntotal} vectors.")
+        embedder.report_throughput()
         
-        # Add to FAISS and map IDs
-        print(f"[*] Syncing {len(embeddings_np)} vectors to FAISS...")
-        embedder.index.add(embeddings_np)
-        
-        for idx, chunk in enumerate(chunks):
-            chunk.vector_id = str(idx)
-        
-        db.commit()
-        embedder._save_index()
-        
-        print(f"\n[+] SUCCESS: Re-indexed {len(chunks)} chunks.")
-        print(f"[+] Final FAISS Index contains {embedder.index.ntotal} vectors.")
+        print(f"\n[+] SUCCESS: Re-indexed {len(rows)} chunks across {len(by_course)} course shards.")
         
     except Exception as e:
         print(f"[!] Re-indexing Failed: {e}")
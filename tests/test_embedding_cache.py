@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.rag.embedding_cache import EmbeddingCache
+
+DIMENSION = 8
+
+
+def vector_for(text: str) -> np.ndarray:
+    seed = int.from_bytes(text.encode("utf-8")[:8].ljust(8, b"\0"), "little") ^ len(text)
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype("float32")
+
+
+def store_texts(cache_dir: str, worker: int, count: int):
+    cache = EmbeddingCache("model", DIMENSION, cache_dir=cache_dir)
+    for start in range(0, count, 50):
+        texts = [f"worker {worker} text {i}" for i in range(start, start + 50)]
+        cache.store(texts, np.stack([vector_for(t) for t in texts]))
+        cache.flush()
+
+
+def assert_cached(cache: EmbeddingCache, texts):
+    found, missing = cache.lookup(texts)
+    assert missing == []
+    for text, vector in zip(texts, found):
+        np.testing.assert_array_equal(vector, vector_for(text))
+
+
+def test_instances_see_each_others_entries(tmp_path):
+    first = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path))
+    second = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path))
+    first.store(["alpha"], vector_for("alpha")[None])
+    second.store(["beta"], vector_for("beta")[None])
+    assert_cached(first, ["alpha", "beta"])
+    assert_cached(second, ["alpha", "beta"])
+    assert_cached(EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path)), ["alpha", "beta"])
+
+
+def test_row_reused_by_another_instance_is_not_served_stale(tmp_path):
+    first = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path), max_entries=4)
+    second = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path), max_entries=4)
+    texts = [f"text {i}" for i in range(4)]
+    first.store(texts, np.stack([vector_for(t) for t in texts]))
+    assert_cached(second, texts)
+
+    first.store(["newcomer"], vector_for("newcomer")[None])  # evicts one of `texts` and reuses its row
+    found, missing = second.lookup(texts + ["newcomer"])
+    assert len(missing) == 1
+    for i, text in enumerate(texts + ["newcomer"]):
+        if i not in missing:
+            np.testing.assert_array_equal(found[i], vector_for(text))
+
+
+def test_compacted_log_is_reloaded_by_other_instances(tmp_path):
+    first = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path), max_entries=100)
+    second = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path), max_entries=100)
+    texts = [f"text {i}" for i in range(3000)]
+    for start in range(0, len(texts), 100):
+        batch = texts[start:start + 100]
+        first.store(batch, np.stack([vector_for(t) for t in batch]))
+    with open(first.index_path) as f:
+        assert sum(1 for _ in f) <= 2 * 1024 + 1
+    assert_cached(second, texts[-100:])
+
+
+def test_concurrent_processes_do_not_overwrite_each_other(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=store_texts, args=(str(tmp_path), worker, 500)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache("model", DIMENSION, cache_dir=str(tmp_path))
+    assert_cached(cache, [f"worker {worker} text {i}" for worker in range(4) for i in range(500)])
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.ingestion.extraction import FontScan, extract_pages, iter_page_texts, spool_pages
+
+
+def make_pdf(path: str, chapters: int = 3):
+    """Chapters with large-font titles and smaller section titles, and no outline."""
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for chapter in range(1, chapters + 1):
+        page = doc.new_page()
+        y = 60
+        page.insert_text((50, y), f"Chapter {chapter} Theories", fontsize=20)
+        y += 30
+        for section in range(1, 3):
+            page.insert_text((50, y), f"{chapter}.{section} Concept Block", fontsize=14)
+            y += 20
+            for i in range(8):
+                page.insert_text((50, y), f"Body line {chapter}.{section}.{i} with some ordinary words in it.", fontsize=10)
+                y += 14
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), f"Continuation of chapter {chapter}. " * 40, fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def test_font_headings_are_collected_during_extraction(tmp_path):
+    path = str(tmp_path / "font.pdf")
+    make_pdf(path)
+    fonts = FontScan()
+    pages = list(extract_pages(path, 6, workers=1, fonts=fonts))
+
+    assert pages == list(iter_page_texts(path))
+    assert fonts.headings() == [
+        (level, title, page)
+        for chapter in range(1, 4)
+        for level, title, page in [(1, f"Chapter {chapter} Theories", 2 * chapter - 2)]
+        + [(2, f"{chapter}.{section} Concept Block", 2 * chapter - 2) for section in range(1, 3)]
+    ]
+
+
+def test_parallel_extraction_collects_the_same_headings(tmp_path):
+    path = str(tmp_path / "font.pdf")
+    make_pdf(path)
+    serial, parallel = FontScan(), FontScan()
+    serial_pages = list(extract_pages(path, 6, workers=1, fonts=serial))
+    parallel_pages = list(extract_pages(path, 6, workers=2, min_pages=2, fonts=parallel))
+
+    assert parallel_pages == serial_pages
+    assert parallel.headings() == serial.headings()
+
+
+def test_spooled_pages_read_back_in_order():
+    pages = [(0, "first page\n"), (1, ""), (2, "unicode é—中\n")]
+    assert list(spool_pages(iter(pages))) == pages
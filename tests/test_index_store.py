@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import sys
+import threading
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.rag.index_store import CourseIndexStore, CourseLocked, course_writer_lock
+
+DIMENSION = 32
+
+
+def make_vectors(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIMENSION)).astype("float32")
+    return np.arange(1, count + 1, dtype="int64"), vectors
+
+
+@pytest.mark.parametrize("index_type", ["ivf", "flat", "hnsw"])
+def test_saved_shard_loads_memory_mapped(tmp_path, index_type):
+    """Builds, saves and reloads a shard through a read-only (mmap) store; searches must find the vectors."""
+    writer = CourseIndexStore(DIMENSION, root=str(tmp_path), index_type=index_type)
+    writer.ann_min_vectors = 100
+    ids, vectors = make_vectors(2000)
+    writer.add(1, ids, vectors)
+    assert writer.kind(writer.get(1)) == index_type
+    writer.save(1)
+
+    reader = CourseIndexStore(DIMENSION, root=str(tmp_path), mmap=True)
+    index = reader.get(1)
+    assert reader.kind(index) == index_type
+    assert index.ntotal == len(ids)
+
+    _, found = index.search(vectors[:5], 1)
+    assert found[:, 0].tolist() == ids[:5].tolist()
+
+
+def corrupt(store: CourseIndexStore, course_id: int, file: str):
+    with open(os.path.join(store.shard_dir(course_id), file), "r+b") as f:
+        f.write(b"garbage!")
+
+
+def test_unreadable_shard_falls_back_to_previous_snapshot(tmp_path):
+    writer = CourseIndexStore(DIMENSION, root=str(tmp_path))
+    ids, vectors = make_vectors(20)
+    writer.add(1, ids[:10], vectors[:10])
+    writer.save(1)
+    writer.add(1, ids[10:], vectors[10:])
+    writer.save(1)
+
+    corrupt(writer, 1, writer.read_manifest(1)["file"])
+    reader = CourseIndexStore(DIMENSION, root=str(tmp_path), mmap=True)
+    reader.verify_checksums = False
+    index = reader.get(1)
+    assert index.ntotal == 10
+    _, found = index.search(vectors[:1], 1)
+    assert found[0, 0] == ids[0]
+
+
+def test_shard_without_readable_snapshot_raises_instead_of_serving_empty_index(tmp_path):
+    writer = CourseIndexStore(DIMENSION, root=str(tmp_path))
+    ids, vectors = make_vectors(10)
+    writer.add(1, ids, vectors)
+    writer.save(1)
+
+    corrupt(writer, 1, writer.read_manifest(1)["file"])
+    reader = CourseIndexStore(DIMENSION, root=str(tmp_path), mmap=True)
+    reader.verify_checksums = False
+    with pytest.raises(RuntimeError):
+        reader.get(1)
+
+
+def test_registry_starts_with_an_unreadable_shard(tmp_path, monkeypatch):
+    from backend.rag import index_store
+    writer = CourseIndexStore(DIMENSION, root=str(tmp_path))
+    ids, vectors = make_vectors(10)
+    for course_id in (1, 2):
+        writer.add(course_id, ids, vectors)
+        writer.save(course_id)
+    with open(os.path.join(writer.shard_dir(1), writer.read_manifest(1)["file"]), "wb") as f:
+        f.write(b"garbage!")
+
+    monkeypatch.setenv("FAISS_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(index_store, "_shared_store", None)
+    store = index_store.init_index_registry(DIMENSION)
+    assert store.get(2).ntotal == 10
+    monkeypatch.setattr(index_store, "_shared_store", None)
+
+
+def test_missing_shard_starts_empty(tmp_path):
+    reader = CourseIndexStore(DIMENSION, root=str(tmp_path), mmap=True)
+    assert reader.get(1).ntotal == 0
+
+
+def hold_lock(root: str, acquired, release):
+    with course_writer_lock(1, root):
+        acquired.set()
+        release.wait(10)
+
+
+@pytest.mark.parametrize("context", ["thread", "process"])
+def test_writer_lock_without_wait_raises_while_held(tmp_path, context):
+    if context == "thread":
+        acquired, release = threading.Event(), threading.Event()
+        holder = threading.Thread(target=hold_lock, args=(str(tmp_path), acquired, release))
+    else:
+        ctx = multiprocessing.get_context("fork")
+        acquired, release = ctx.Event(), ctx.Event()
+        holder = ctx.Process(target=hold_lock, args=(str(tmp_path), acquired, release))
+    holder.start()
+    try:
+        assert acquired.wait(10)
+        with pytest.raises(CourseLocked):
+            with course_writer_lock(1, str(tmp_path), wait=False):
+                pass
+    finally:
+        release.set()
+        holder.join()
+    with course_writer_lock(1, str(tmp_path), wait=False):
+        pass
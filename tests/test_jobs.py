@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import pytest
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Course, IngestionJob, JobStatus
+from backend.database.models.course import IngestionStatus
+from backend.ingestion.jobs import claim_next_job, enqueue_job, finish_job, job_heartbeat, requeue_stale_jobs
+
+
+def make_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def claimed_job(db, started_minutes_ago: float):
+    db.add(Course(title="Course"))
+    db.commit()
+    enqueue_job(db, 1, "notes.pdf")
+    job = claim_next_job(db, "worker-a")
+    job.started_at = job.heartbeat_at = datetime.utcnow() - timedelta(minutes=started_minutes_ago)
+    db.commit()
+    return job
+
+
+def test_long_running_job_with_recent_heartbeat_is_not_requeued(tmp_path):
+    db = make_session_factory(tmp_path)()
+    job = claimed_job(db, started_minutes_ago=120)
+    job.heartbeat_at = datetime.utcnow()
+    db.commit()
+
+    assert requeue_stale_jobs(db, timeout_seconds=300) == 0
+    db.refresh(job)
+    assert job.status == JobStatus.RUNNING
+
+
+def test_job_without_heartbeat_is_requeued(tmp_path):
+    db = make_session_factory(tmp_path)()
+    job = claimed_job(db, started_minutes_ago=10)
+
+    assert requeue_stale_jobs(db, timeout_seconds=300) == 1
+    db.refresh(job)
+    assert job.status == JobStatus.QUEUED
+
+
+def test_heartbeat_refreshes_running_job(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    db = session_factory()
+    job = claimed_job(db, started_minutes_ago=10)
+
+    with job_heartbeat(session_factory, job.id, "worker-a", interval=0.05):
+        time.sleep(0.3)
+    db.expire_all()
+    assert datetime.utcnow() - db.get(IngestionJob, job.id).heartbeat_at < timedelta(seconds=5)
+    assert requeue_stale_jobs(db, timeout_seconds=300) == 0
+
+
+def test_upload_hash_reaches_the_processor_without_rehashing(tmp_path, monkeypatch):
+    from backend.ingestion import processor as processor_module
+    monkeypatch.setenv("FAISS_INDEX_DIR", str(tmp_path / "faiss"))
+    monkeypatch.setattr(processor_module, "file_sha256", lambda path: pytest.fail("file hashed again"))
+    db = make_session_factory(tmp_path)()
+    db.add(Course(title="Course"))
+    db.commit()
+    (tmp_path / "notes.pdf").write_bytes(b"%PDF-1.4")
+    job = enqueue_job(db, 1, str(tmp_path / "notes.pdf"), source_hash="ab" * 32)
+    assert claim_next_job(db, "worker-a").source_hash == "ab" * 32
+
+    seen = []
+    processor = processor_module.MaterialProcessor(db)
+    processor._reuse_known_document = lambda course_id, source_hash: seen.append(source_hash) or True
+    assert processor.process_material(1, job.file_path, job.file_type, job.source_hash)
+    assert seen == ["ab" * 32]
+
+
+def test_no_hashing_when_deduplication_is_off(tmp_path, monkeypatch):
+    from backend.ingestion import processor as processor_module
+    monkeypatch.setenv("FAISS_INDEX_DIR", str(tmp_path / "faiss"))
+    monkeypatch.setenv("INGESTION_DEDUPLICATE", "0")
+    monkeypatch.setattr(processor_module, "file_sha256", lambda path: pytest.fail("file hashed"))
+    db = make_session_factory(tmp_path)()
+    db.add(Course(title="Course"))
+    db.commit()
+
+    (tmp_path / "notes.pdf").write_bytes(b"%PDF-1.4")
+
+    processor = processor_module.MaterialProcessor(db)
+    processor._extract_structure = lambda file_path, file_type: []
+    with pytest.raises(processor_module.IngestionError, match="No text could be extracted from notes.pdf"):
+        processor.process_material(1, str(tmp_path / "notes.pdf"), "pdf")
+    assert db.get(Course, 1).ingestion_status == IngestionStatus.FAILED
+
+
+def test_deterministic_failure_is_not_retried(tmp_path):
+    db = make_session_factory(tmp_path)()
+    job = claimed_job(db, started_minutes_ago=1)
+
+    finish_job(db, job, False, "No text could be extracted from notes.pdf", retry=False)
+    assert job.status == JobStatus.FAILED
+    assert job.error == "No text could be extracted from notes.pdf"
+
+
+def test_transient_failure_is_retried(tmp_path):
+    db = make_session_factory(tmp_path)()
+    job = claimed_job(db, started_minutes_ago=1)
+
+    finish_job(db, job, False, "OperationalError: database is locked")
+    assert job.status == JobStatus.QUEUED
+    assert job.error == "OperationalError: database is locked"
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The LLM client is created at import time; no request is ever sent in these tests
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from backend.quiz.professor_bot import ProfessorBot
+
+
+class SlowLLM:
+    """Records the system prompt of every call and yields to the event loop mid-call."""
+
+    def __init__(self, db=None):
+        self.db = db
+        self.system_prompts = []
+        self.open_transactions = 0
+
+    async def generate_content_async(self, prompt, system_prompt=None):
+        self.open_transactions += bool(self.db is not None and self.db.in_transaction())
+        await asyncio.sleep(0.05)
+        self.system_prompts.append(system_prompt)
+        return f"Question: {system_prompt}?\nIdeal Answer: yes"
+
+
+def make_bot(db, query=False):
+    bot = ProfessorBot(db, None, None)
+    bot.llm = SlowLLM(db)
+    # Stands in for the graph lookup; the query opens the session's transaction
+    bot._fetch_graph_relations = lambda chunk_id: (db.execute(text("SELECT 1")) if query else None) and []
+    bot._store_question = lambda chunk, raw_text: raw_text
+    return bot
+
+
+def make_chunk():
+    section = SimpleNamespace(title="Section")
+    return SimpleNamespace(id=1, content="Text", subsection=SimpleNamespace(title="Part", section=section))
+
+
+def test_concurrent_generations_keep_their_own_instructions():
+    bot = make_bot(Session(create_engine("sqlite://")))
+    bot.instructions = "Stale instructions set on the shared bot"
+    chunk = make_chunk()
+
+    async def run():
+        return await asyncio.gather(*(
+            bot.generate_single_question_async(chunk, instructions=f"Instructions {n}") for n in range(5)
+        ))
+
+    results = asyncio.run(run())
+    assert results == [f"Question: Instructions {n}?\nIdeal Answer: yes" for n in range(5)]
+    assert sorted(bot.llm.system_prompts) == sorted(f"Instructions {n}" for n in range(5))
+
+
+def test_no_transaction_is_held_while_awaiting_the_llm():
+    db = Session(create_engine("sqlite://"))
+    bot = make_bot(db, query=True)
+
+    asyncio.run(bot.generate_single_question_async(make_chunk(), instructions="Be brief"))
+    assert bot.llm.system_prompts == ["Be brief"]
+    assert bot.llm.open_transactions == 0
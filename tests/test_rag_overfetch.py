@@ -0,0 +1,63 @@
+import os
+import sys
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.database.models.chunk import ChunkType
+from backend.rag.embedder import RAGService
+
+
+@pytest.mark.parametrize("factor", ["1", "0.5", "-2"])
+def test_overfetch_factor_must_exceed_one(monkeypatch, factor):
+    monkeypatch.setenv("RAG_OVERFETCH_FACTOR", factor)
+    with pytest.raises(ValueError):
+        RAGService(None, None)
+
+
+def test_small_overfetch_factor_still_grows(monkeypatch):
+    monkeypatch.setenv("RAG_OVERFETCH_FACTOR", "1.01")
+    service = RAGService(None, None)
+    assert service._grow(3) == 4
+    assert service._grow(1000) == 1010
+
+
+class FakeShard:
+    """Flat shard whose hit i has distance i and chunk id i."""
+
+    def __init__(self, ntotal):
+        self.ntotal = ntotal
+
+    def search(self, query, k):
+        return np.arange(k, dtype="float32")[None, :], np.arange(k)[None, :]
+
+
+def make_service(ntotal, matching):
+    """RAGService over one FakeShard where only chunk ids in `matching` pass the type filter."""
+    store = SimpleNamespace(get=lambda course_id: FakeShard(ntotal), course_ids=lambda: [1])
+    service = RAGService(None, SimpleNamespace(store=store, embed_query=lambda query: np.zeros((1, 4), "float32")))
+    service.resolved = []
+
+    def resolve(hits, chunk_types=None):
+        service.resolved.append([chunk_id for _, chunk_id in hits])
+        return [(chunk_id, dist) for dist, chunk_id in hits if chunk_id in matching]
+
+    service._resolve = resolve
+    return service
+
+
+def test_unindexed_chunk_types_return_nothing_without_searching():
+    service = make_service(1000, matching=set(range(1000)))
+    assert service.search("query", top_k=3, chunk_types=[ChunkType.LARGE]) == []
+    assert service.resolved == []
+
+
+def test_overfetch_rounds_resolve_only_new_hits():
+    service = make_service(1000, matching={5, 40, 90})
+    results = service.search("query", top_k=3, chunk_types=[ChunkType.SMALL])
+    assert results == [(5, 5.0), (40, 40.0), (90, 90.0)]
+    resolved = [chunk_id for batch in service.resolved for chunk_id in batch]
+    assert len(resolved) == len(set(resolved))
+    assert len(service.resolved) > 1
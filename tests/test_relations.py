@@ -0,0 +1,67 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Course, Chapter, Section, Subsection, Chunk, ChunkType
+from backend.database.models.chunk import KnowledgeRelation
+from backend.ingestion.relations import build_keyword_relations
+
+TEXTS = ["Foucault and Legibility", "Foucault on power", "Weber, then Foucault again"]
+
+
+def make_course(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'relations.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    section = Section(title="Section", order=1, chapter=Chapter(title="Chapter", order=1, course=Course(title="Course")))
+    subsections = [Subsection(title=f"Part {i}", order=i, section=section) for i in range(len(TEXTS))]
+    for subsection, text in zip(subsections, TEXTS):
+        subsection.chunks.append(Chunk(content=text, chunk_type=ChunkType.MEDIUM))
+    db.add(section)
+    db.commit()
+    return db, [subsection.id for subsection in subsections]
+
+
+def subsection_graph(db):
+    """(source subsection, target subsection, label) for every relation."""
+    chunk_subsection = dict(db.query(Chunk.id, Chunk.subsection_id).all())
+    return {(chunk_subsection[r.source_id], chunk_subsection[r.target_id], r.relation_type)
+            for r in db.query(KnowledgeRelation)}
+
+
+def rechunk(db, subsection_id, text):
+    """Replaces the subsection's chunk, which drops every relation touching the old one."""
+    subsection = db.get(Subsection, subsection_id)
+    for chunk in list(subsection.chunks):
+        db.delete(chunk)
+    subsection.chunks.append(Chunk(content=text, chunk_type=ChunkType.MEDIUM))
+    db.commit()
+
+
+def test_rechunked_subsection_gets_the_graph_of_a_fresh_build(tmp_path):
+    db, ids = make_course(tmp_path)
+    build_keyword_relations(db, 1, ids, earlier_only=True)
+    fresh = subsection_graph(db)
+    assert (ids[2], ids[1], "shared_concept:Foucault") in fresh
+    assert (ids[1], ids[2], "shared_concept:Foucault") not in fresh
+
+    rechunk(db, ids[1], TEXTS[1])
+    assert not any(ids[1] in (source, target) for source, target, _ in subsection_graph(db))
+
+    build_keyword_relations(db, 1, [ids[1]], earlier_only=True, incoming=True)
+    assert subsection_graph(db) == fresh
+
+
+def test_earlier_only_follows_document_order_not_ids(tmp_path):
+    db, ids = make_course(tmp_path)
+    # The last stored subsection comes first in the document
+    db.get(Subsection, ids[2]).order = -1
+    db.commit()
+
+    build_keyword_relations(db, 1, ids, earlier_only=True)
+    graph = subsection_graph(db)
+    assert (ids[0], ids[2], "shared_concept:Foucault") in graph
+    assert (ids[2], ids[0], "shared_concept:Foucault") not in graph
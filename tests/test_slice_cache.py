@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Course, Chapter, Section, Subsection, RawMaterial, Chunk, ChunkType
+from backend.database.models.chunk import load_span_texts
+from backend.database.slice_cache import slice_cache
+
+
+def make_span_chunk(db, text: str):
+    course = Course(title="Course")
+    chapter = Chapter(title="Chapter", course=course)
+    section = Section(title="Section", chapter=chapter)
+    subsection = Subsection(title="Subsection", section=section)
+    material = RawMaterial(content=text, source_type="pdf", subsection=subsection)
+    chunk = Chunk(raw_material=material, start_offset=0, end_offset=len(text), chunk_type=ChunkType.SMALL,
+                  subsection=subsection)
+    db.add(course)
+    db.commit()
+    return course, material, chunk
+
+
+def test_reused_raw_material_id_does_not_serve_stale_text(tmp_path):
+    """SQLite reuses ids after a delete; the slice cache must not return the deleted document's text."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    course, old_material, old_chunk = make_span_chunk(db, "old document text")
+    assert old_chunk.content == "old document text"
+    old_ids = (old_material.id, old_chunk.id)
+    db.delete(old_chunk)
+    db.delete(course)
+    db.delete(old_material)
+    db.commit()
+    db.expunge_all()
+
+    _, material, chunk = make_span_chunk(db, "new document text")
+    assert (material.id, chunk.id) == old_ids
+    assert chunk.content == "new document text"
+    db.close()
+
+
+def test_span_texts_load_without_raw_material_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'spans.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    text = "a long raw material " * 50
+    _, material, chunk = make_span_chunk(db, text)
+    chunk.start_offset, chunk.end_offset = 2, 6
+    db.commit()
+    chunk_id = chunk.id
+    db.expunge_all()
+    slice_cache.clear()
+
+    chunk = db.get(Chunk, chunk_id)
+    load_span_texts(db, [chunk])
+    assert chunk.content == "long"
+    assert "raw_material" not in inspect(chunk).dict
+    db.close()
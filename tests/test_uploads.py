@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from backend.utils.uploads import receive_upload, UploadTooLarge
+
+MAX_BYTES = 2 * 1024 * 1024
+
+
+def make_client(upload_dir: str) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        try:
+            path, sha256, size, filename = await receive_upload(request, "file", ".pdf", upload_dir, MAX_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"path": path, "sha256": sha256, "size": size, "filename": filename}
+
+    return TestClient(app)
+
+
+def multipart_body(payload: bytes, boundary: str = "testboundary") -> bytes:
+    return (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"notes.pdf\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+
+
+def test_upload_is_stored_content_addressed(tmp_path):
+    payload = os.urandom(300 * 1024)
+    response = make_client(str(tmp_path)).post("/upload", files={"file": ("notes.pdf", payload)}, data={"note": "hi"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["filename"] == "notes.pdf"
+    assert body["sha256"] == hashlib.sha256(payload).hexdigest()
+    with open(body["path"], "rb") as f:
+        assert f.read() == payload
+    assert sorted(os.listdir(tmp_path)) == [f"{body['sha256']}.pdf"]
+
+
+def test_chunked_upload_without_content_length_is_streamed(tmp_path):
+    payload = os.urandom(MAX_BYTES - 1024)
+    body = multipart_body(payload)
+    chunks = (body[i:i + 64 * 1024] for i in range(0, len(body), 64 * 1024))
+    response = make_client(str(tmp_path)).post(
+        "/upload", content=chunks, headers={"Content-Type": "multipart/form-data; boundary=testboundary"})
+    assert response.status_code == 200
+    assert response.json()["size"] == len(payload)
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_oversized_upload_is_rejected_and_leaves_nothing(tmp_path, chunked):
+    body = multipart_body(os.urandom(MAX_BYTES + 1))
+    content = (body[i:i + 64 * 1024] for i in range(0, len(body), 64 * 1024)) if chunked else body
+    response = make_client(str(tmp_path)).post(
+        "/upload", content=content, headers={"Content-Type": "multipart/form-data; boundary=testboundary"})
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_missing_file_field_is_a_bad_request(tmp_path):
+    response = make_client(str(tmp_path)).post("/upload", data={"note": "no file here"},
+                                               files={"other": ("x.pdf", b"data")})
+    assert response.status_code == 400
+    assert os.listdir(tmp_path) == []